@@ -9,46 +9,785 @@
 # 4. Jalankan aplikasi dengan mengetik di terminal:
 #    python app.py
 #    (Sebuah file database bernama `bookings.db` akan otomatis dibuat)
+#    Untuk produksi gunakan server WSGI, misalnya: gunicorn "app:create_app()"
+#    Schema database dimigrasikan otomatis saat koneksi pertama, atau
+#    secara eksplisit dengan: flask --app app init-db
 # 5. Buka browser Anda dan kunjungi http://127.0.0.1:5000
 # 6. Untuk masuk ke halaman admin, kunjungi http://127.0.0.1:5000/admin (Password: admin123)
+# 7. (Opsional) Bangun CSS dan font lokal agar halaman tidak bergantung pada
+#    Tailwind CDN dan Google Fonts: unduh Tailwind standalone CLI (v3), letakkan
+#    font di assets/src/fonts/, lalu jalankan: flask --app app build-assets
 
+import atexit
+import click
+import collections
+import csv
+import datetime
+import functools
+import gzip
+import hashlib
+import hmac
+import io
+import ipaddress
+import itertools
+import json
+import math
+import mimetypes
+import multiprocessing
+import os
+import queue
+import random
+import re
+import shlex
+import shutil
+import smtplib
 import sqlite3
-from flask import Flask, render_template_string, request, redirect, url_for, session, g
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email.message import EmailMessage
+from flask import (Blueprint, Flask, current_app, render_template, request, redirect, url_for, session, g,
+                   make_response, jsonify, Response, abort, send_from_directory, has_request_context,
+                   before_render_template, template_rendered)
+from flask.cli import AppGroup
+from jinja2 import DictLoader
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
 
-# Inisialisasi aplikasi Flask
-app = Flask(__name__)
-# Kunci rahasia diperlukan untuk menggunakan session (untuk login)
-app.secret_key = 'kunci_rahasia_fotografi_anda'
+try:
+    import brotli
+except ImportError:
+    brotli = None  # varian .br dilewati; gzip tetap dibuat
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None  # galeri memakai foto placeholder
 
 DATABASE = 'bookings.db'
 
+# Konfigurasi bawaan. Bisa ditimpa lewat create_app(config) atau variabel
+# lingkungan berawalan FOTOGRAFI_, misalnya FOTOGRAFI_DATABASE=/data/bookings.db
+DEFAULT_CONFIG = dict(
+    # Kunci rahasia diperlukan untuk menggunakan session (untuk login)
+    SECRET_KEY='kunci_rahasia_fotografi_anda',
+    DATABASE=DATABASE,
+
+    # Cara /submit menyimpan pesanan:
+    #   BOOKING_INGEST      'direct' = INSERT + commit di dalam request,
+    #                       'queue'  = lewat antrean, disimpan per batch oleh thread penulis
+    #   BOOKING_DURABILITY  'commit' = respons menunggu batch tersimpan,
+    #                       'async'  = respons langsung kembali (fire-and-forget)
+    BOOKING_INGEST='direct',
+    BOOKING_DURABILITY='commit',
+    BOOKING_QUEUE_SIZE=1000,
+    BOOKING_BATCH_SIZE=100,
+    BOOKING_BATCH_DELAY=0.01,
+    BOOKING_WAIT_TIMEOUT=10.0,
+
+    # Pool koneksi SQLite dan pengaturan PRAGMA untuk setiap koneksi.
+    DB_POOL_SIZE=8,
+    DB_POOL_TIMEOUT=5.0,
+    DB_HEALTHCHECK_INTERVAL=30.0,
+    DB_CACHE_SIZE_KIB=16384,
+    DB_MMAP_SIZE=256 * 1024 * 1024,
+    DB_BUSY_TIMEOUT_MS=5000,
+    DB_CACHED_STATEMENTS=256,
+
+    # Perlakuan pesanan untuk tanggal yang kapasitas paketnya sudah penuh:
+    #   'reject' = ditolak dengan pesan di formulir
+    #   'flag'   = tetap diterima, tanggalnya ditandai overbooked di dashboard
+    OVERBOOKING='reject',
+
+    # Instrumentasi: metrik Prometheus di /metrics, dan header Server-Timing
+    # (berguna di DevTools browser) jika SERVER_TIMING aktif. /metrics hanya
+    # untuk admin yang login atau alamat di METRICS_ALLOWED_NETWORKS
+    # (misalnya jaringan Prometheus; di balik proxy atur juga PROXY_FIX_X_FOR).
+    METRICS_ENABLED=True,
+    METRICS_ALLOWED_NETWORKS=('127.0.0.1/32', '::1/128'),
+    SERVER_TIMING=False,
+
+    # Notifikasi ke pelanggan lewat tabel outbox. NOTIFY_SENDERS memetakan
+    # kanal ke backend: 'log' (hanya dicatat), 'smtp', 'webhook' (WhatsApp
+    # gateway), atau objek pengirim sendiri. NOTIFY_DISPATCHER 'thread'
+    # menjalankan pengirim di dalam proses web; 'off' jika pengiriman
+    # dijalankan terpisah dengan `flask notify`.
+    NOTIFY_SENDERS={'email': 'log', 'whatsapp': 'log'},
+    NOTIFY_DISPATCHER='thread',
+    NOTIFY_WORKERS=2,
+    NOTIFY_BATCH_SIZE=20,
+    NOTIFY_POLL_INTERVAL=2.0,
+    NOTIFY_LEASE=60.0,
+    NOTIFY_MAX_ATTEMPTS=6,
+    NOTIFY_BACKOFF_BASE=30.0,
+    NOTIFY_BACKOFF_MAX=3600.0,
+    # Notifikasi terkirim dihapus dari outbox setelah sekian hari
+    # (diperiksa paling sering sekali per NOTIFY_PRUNE_INTERVAL detik).
+    NOTIFY_RETENTION_DAYS=30,
+    NOTIFY_PRUNE_INTERVAL=3600.0,
+    SMTP_HOST='localhost',
+    SMTP_PORT=25,
+    SMTP_USERNAME=None,
+    SMTP_PASSWORD=None,
+    SMTP_STARTTLS=False,
+    SMTP_FROM='FotografiKu <noreply@fotografiku.id>',
+    WHATSAPP_WEBHOOK_URL=None,
+    WHATSAPP_TOKEN=None,
+
+    # Aset statis hasil `flask build-assets`. Path relatif dihitung dari
+    # folder aplikasi. Selama manifest belum ada, template tetap memakai
+    # Tailwind CDN dan Google Fonts.
+    ASSETS_SOURCE_DIR='assets/src',
+    ASSETS_DIR='assets/build',
+    TAILWIND_BIN='tailwindcss',
+
+    # Galeri portofolio (butuh Pillow). Foto asli di PORTFOLIO_DIR diproses
+    # menjadi beberapa lebar per format; PORTFOLIO_WORKERS None berarti
+    # sebanyak jumlah CPU.
+    PORTFOLIO_DIR='portfolio/originals',
+    PORTFOLIO_CACHE_DIR='portfolio/derived',
+    PORTFOLIO_WIDTHS=(320, 640, 1024, 1600),
+    PORTFOLIO_FORMATS=('webp', 'jpeg'),
+    PORTFOLIO_QUALITY=80,
+    PORTFOLIO_WORKERS=None,
+
+    # Rate limit token bucket untuk POST, per IP dan per endpoint:
+    # {endpoint: (jumlah request, per detik)}. RATE_LIMIT_STORAGE 'memory'
+    # (per worker, LRU RATE_LIMIT_MAX_KEYS) atau 'sqlite' (dibagi semua
+    # worker lewat RATE_LIMIT_DATABASE). Di belakang reverse proxy, atur
+    # PROXY_FIX_X_FOR ke jumlah proxy agar IP klien terbaca dengan benar.
+    RATE_LIMITS={
+        'fotografi.submit': (10, 60),
+        'fotografi.admin_login': (5, 300),
+    },
+    RATE_LIMIT_STORAGE='memory',
+    RATE_LIMIT_MAX_KEYS=10000,
+    RATE_LIMIT_DATABASE='ratelimit.db',
+    PROXY_FIX_X_FOR=0,
+
+    # Arsip pesanan: pesanan 'Selesai'/'Dibatalkan' yang tanggal acaranya
+    # lebih lama dari ARCHIVE_AFTER_DAYS dipindahkan ke bookings_archive,
+    # di database yang sama atau di file ARCHIVE_DATABASE (di-ATTACH sebagai
+    # 'arsip'). Pemindahan berjalan per batch kecil lalu diikuti incremental
+    # vacuum. ARCHIVE_INTERVAL (detik) menjalankannya di latar belakang;
+    # None berarti hanya lewat `flask archive run` (misalnya dari cron).
+    ARCHIVE_DATABASE=None,
+    ARCHIVE_AFTER_DAYS=180,
+    ARCHIVE_BATCH_SIZE=500,
+    ARCHIVE_BATCH_PAUSE=0.05,
+    ARCHIVE_INTERVAL=None,
+    VACUUM_STEP_PAGES=2000,
+)
+
+# Semua route, hook dan perintah CLI didaftarkan ke blueprint ini, lalu
+# dipasang ke aplikasi oleh create_app().
+bp = Blueprint('fotografi', __name__, cli_group=None)
+
+# --- INSTRUMENTASI ---
+
+# Batas bucket histogram latensi, dalam detik
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Metrics:
+    """Registri counter, histogram dan gauge yang bisa ditulis dalam format Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = []
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self._help[name] = (kind, help_text, buckets)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self._help[name][2]
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+                    break
+            hist[1] += value
+            hist[2] += 1
+
+    def gauge(self, name, help_text, callback, kind='gauge'):
+        """Mendaftarkan metrik yang dibaca saat scrape.
+
+        callback mengembalikan [(labels, nilai), ...]; kind 'counter' dipakai
+        untuk penghitung yang disimpan di tempat lain (misalnya di pool).
+        """
+        self.describe(name, kind, help_text)
+        self._gauges.append((name, callback))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+        samples = {}
+        for (name, labels), value in counters:
+            samples.setdefault(name, []).append('%s%s %s' % (name, _labels(labels), value))
+        for (name, labels), (counts, total, count) in histograms:
+            out = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(self._help[name][2], counts):
+                cumulative += bucket_count
+                out.append('%s_bucket%s %d' % (name, _labels(labels + (('le', repr(float(bound))),)), cumulative))
+            out.append('%s_bucket%s %d' % (name, _labels(labels + (('le', '+Inf'),)), count))
+            out.append('%s_sum%s %.6f' % (name, _labels(labels), total))
+            out.append('%s_count%s %d' % (name, _labels(labels), count))
+        for name, callback in self._gauges:
+            for labels, value in callback():
+                samples.setdefault(name, []).append(
+                    '%s%s %s' % (name, _labels(tuple(sorted(labels.items()))), value))
+        for name in sorted(samples):
+            kind, help_text, _ = self._help[name]
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            lines.extend(samples[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+
+
+metrics = Metrics()
+metrics.describe('http_requests_total', 'counter', 'Jumlah request HTTP per endpoint dan status.')
+metrics.describe('http_request_duration_seconds', 'histogram', 'Latensi request HTTP per endpoint.', LATENCY_BUCKETS)
+metrics.describe('db_queries_per_request', 'histogram', 'Jumlah query SQLite per request.', COUNT_BUCKETS)
+metrics.describe('db_query_duration_seconds', 'histogram', 'Durasi eksekusi query SQLite per jenis statement.', LATENCY_BUCKETS)
+metrics.describe('db_commit_duration_seconds', 'histogram', 'Durasi commit SQLite (menulis WAL dan fsync).', LATENCY_BUCKETS)
+metrics.describe('db_lock_wait_seconds', 'histogram', 'Lama menunggu kunci tulis SQLite (BEGIN IMMEDIATE).', LATENCY_BUCKETS)
+metrics.describe('template_render_duration_seconds', 'histogram', 'Durasi render template Jinja.', LATENCY_BUCKETS)
+
+
+# Statement yang membuat modul sqlite3 membuka transaksi secara implisit
+WRITE_STATEMENTS = ('insert', 'update', 'delete', 'replace')
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Koneksi SQLite yang mencatat jumlah dan durasi query, kunci tulis serta commit."""
+
+    # Diatur oleh connect_db() dari METRICS_ENABLED
+    instrumented = True
+
+    def _begin_for(self, sql):
+        """Membuka transaksi sendiri sebelum statement tulis pertama.
+
+        Modul sqlite3 akan mengirim BEGIN IMMEDIATE (isolation_level koneksi
+        pool) di dalam execute() statement itu, sehingga waktu menunggu kunci
+        tulis tercampur dengan durasi query. Di sini BEGIN dikirim terpisah
+        agar tercatat di db_lock_wait_seconds.
+        """
+        if (self.isolation_level is not None and not self.in_transaction
+                and sql.lstrip()[:7].lower().startswith(WRITE_STATEMENTS)):
+            self.execute('BEGIN ' + self.isolation_level)
+
+    def execute(self, sql, parameters=()):
+        if not self.instrumented:
+            return super().execute(sql, parameters)
+        self._begin_for(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not self.instrumented:
+            return super().executemany(sql, seq_of_parameters)
+        self._begin_for(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - started)
+
+    def commit(self):
+        if not self.instrumented:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _record_query('COMMIT', time.perf_counter() - started)
+
+
+def _record_query(sql, elapsed):
+    statement = sql.lstrip().split(None, 1)[0].lower() if sql.strip() else 'kosong'
+    if statement == 'commit':
+        metrics.observe('db_commit_duration_seconds', elapsed)
+    elif statement == 'begin':
+        metrics.observe('db_lock_wait_seconds', elapsed)
+    else:
+        metrics.observe('db_query_duration_seconds', elapsed, statement=statement)
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+    g.template_time = 0.0
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'tidak_dikenal'
+    if current_app.config['METRICS_ENABLED']:
+        metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.observe('http_request_duration_seconds', elapsed, endpoint=endpoint, method=request.method)
+        metrics.observe('db_queries_per_request', g.db_queries, endpoint=endpoint)
+    if current_app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = (
+            'app;dur=%.2f, db;dur=%.2f;desc="%d query", tpl;dur=%.2f'
+            % (elapsed * 1000, g.db_time * 1000, g.db_queries, g.template_time * 1000)
+        )
+    return response
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context():
+        g.template_started = time.perf_counter()
+
+def _template_finished(sender, template, context, **extra):
+    if has_request_context() and 'template_started' in g:
+        elapsed = time.perf_counter() - g.pop('template_started')
+        g.template_time = g.get('template_time', 0.0) + elapsed
+        if sender.config['METRICS_ENABLED']:
+            metrics.observe('template_render_duration_seconds', elapsed, template=template.name)
+
+def metrics_client_allowed():
+    """True jika alamat klien termasuk METRICS_ALLOWED_NETWORKS."""
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in current_app.config['METRICS_ALLOWED_NETWORKS'])
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Menampilkan metrik aplikasi dalam format teks Prometheus."""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    if not session.get('logged_in') and not metrics_client_allowed():
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # --- FUNGSI DATABASE ---
 
+def connect_db(config, isolation_level='IMMEDIATE'):
+    """Membuka koneksi SQLite yang sudah disetel sesuai konfigurasi aplikasi.
+
+    Transaksi implisit memakai BEGIN IMMEDIATE: kunci tulis diambil di awal
+    transaksi (dan waktunya terukur), bukan di tengah saat statement tulis
+    pertama atau saat commit.
+    """
+    db = sqlite3.connect(
+        config['DATABASE'],
+        timeout=config['DB_BUSY_TIMEOUT_MS'] / 1000,
+        isolation_level=isolation_level,
+        check_same_thread=False,
+        cached_statements=config['DB_CACHED_STATEMENTS'],
+        factory=InstrumentedConnection,
+    )
+    db.instrumented = config['METRICS_ENABLED']
+    db.row_factory = sqlite3.Row
+    # auto_vacuum harus diset sebelum file pertama kali ditulis (termasuk
+    # oleh journal_mode=WAL); untuk file lama pragma ini tidak berpengaruh,
+    # konversinya lewat `flask archive enable-auto-vacuum`.
+    db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    # WAL: pembaca tidak memblokir penulis dan sebaliknya. Dengan WAL,
+    # synchronous=NORMAL tetap aman dari korupsi dan jauh lebih sedikit fsync,
+    # tetapi commit terakhir bisa hilang saat listrik padam. Penyimpanan
+    # pesanan yang responsnya menjanjikan data sudah tersimpan menaikkannya
+    # ke FULL (lihat submit() dan BookingQueue).
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.execute('PRAGMA cache_size=-%d' % config['DB_CACHE_SIZE_KIB'])
+    db.execute('PRAGMA mmap_size=%d' % config['DB_MMAP_SIZE'])
+    db.execute('PRAGMA busy_timeout=%d' % config['DB_BUSY_TIMEOUT_MS'])
+    db.execute('PRAGMA temp_store=MEMORY')
+    if config['ARCHIVE_DATABASE']:
+        db.execute('ATTACH DATABASE ? AS arsip', (config['ARCHIVE_DATABASE'],))
+        db.execute('PRAGMA arsip.auto_vacuum=INCREMENTAL')
+        db.execute('PRAGMA arsip.journal_mode=WAL')
+        db.execute('PRAGMA arsip.synchronous=NORMAL')
+    return db
+
+
+class PoolTimeout(Exception):
+    """Tidak ada koneksi yang bebas dalam batas waktu yang ditentukan."""
+
+
+class ConnectionPool:
+    """Pool koneksi SQLite yang aman dipakai dari banyak thread.
+
+    Koneksi berumur panjang dan dipinjamkan ke satu thread pada satu waktu.
+    Koneksi yang lama menganggur diperiksa dulu sebelum dipakai kembali.
+    """
+
+    def __init__(self, connect, max_size=8, timeout=5.0, healthcheck_interval=30.0):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = dict.fromkeys(['created', 'acquired', 'waits', 'timeouts', 'discarded'], 0)
+
+    def acquire(self):
+        """Meminjam koneksi; melempar PoolTimeout jika pool penuh terlalu lama."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if not self._idle and self._size >= self.max_size:
+                self._stats['waits'] += 1
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout('Semua %d koneksi database sedang dipakai' % self.max_size)
+            self._stats['acquired'] += 1
+            if self._idle:
+                db, last_used = self._idle.pop()
+            else:
+                db, last_used = None, None
+                self._size += 1
+
+        if db is not None and time.monotonic() - last_used > self.healthcheck_interval:
+            if not self._is_healthy(db):
+                self._discard(db)
+                with self._cond:
+                    self._size += 1
+                db = None
+        if db is None:
+            try:
+                db = self.connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+        return db
+
+    def release(self, db):
+        """Mengembalikan koneksi ke pool, membatalkan transaksi yang menggantung."""
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except sqlite3.Error:
+            self._discard(db)
+            return
+        with self._cond:
+            self._idle.append((db, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                max_size=self.max_size,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+            )
+        return stats
+
+    def _is_healthy(self, db):
+        try:
+            db.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, db):
+        try:
+            db.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+
+def get_pool():
+    """Pool koneksi aplikasi aktif; schema dimigrasikan dulu jika perlu."""
+    state = get_state()
+    if not state.schema_ready:
+        state.ensure_schema()
+    return state.pool
+
 def get_db():
-    """Membuka koneksi baru jika belum ada untuk konteks saat ini."""
+    """Meminjam koneksi dari pool jika belum ada untuk konteks saat ini."""
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool().acquire()
     return g.db
 
-@app.teardown_appcontext
 def close_db(exception):
-    """Menutup koneksi database di akhir request."""
+    """Mengembalikan koneksi database ke pool di akhir request."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
 
-def init_db():
-    """Inisialisasi database dan membuat tabel jika belum ada."""
-    with app.app_context():
-        db = get_db()
-        with app.open_resource('schema.sql', mode='r') as f:
-            db.cursor().executescript(f.read())
-        db.commit()
-
-# Membuat file schema.sql secara virtual
-# Dalam proyek nyata, ini akan menjadi file terpisah.
-schema_sql = """
+class BookingRejected(Exception):
+    """Pesanan ditolak, misalnya karena tanggalnya sudah penuh."""
+
+    @classmethod
+    def date_full(cls, booking):
+        return cls('Maaf, %s pada tanggal %s sudah penuh. Silakan pilih tanggal lain.'
+                   % (booking['layanan'], booking['tanggal_acara']))
+
+
+def check_capacity(db, booking):
+    """Pemeriksaan kapasitas hanya-baca sebelum pesanan masuk antrean async.
+
+    Pada BOOKING_DURABILITY='async' pelanggan sudah dialihkan ke halaman
+    sukses sebelum pesanan disimpan, jadi penolakan harus terjadi di sini.
+    Dua pesanan yang lolos bersamaan untuk slot terakhir tetap disimpan dan
+    tampil sebagai overbooked di dashboard.
+    """
+    if current_app.config['OVERBOOKING'] != 'reject':
+        return
+    if booking.get('idempotency_key') and db.execute(
+            'SELECT 1 FROM bookings WHERE idempotency_key = ?', (booking['idempotency_key'],)).fetchone():
+        return
+    row = db.execute(
+        'SELECT packages.capacity, availability.terisi FROM packages '
+        'JOIN availability ON availability.package_id = packages.id AND availability.tanggal = ? '
+        'WHERE packages.id = ?',
+        (booking['tanggal_acara'], booking['package_id'])
+    ).fetchone()
+    if row is not None and row['capacity'] is not None and row['terisi'] >= row['capacity']:
+        raise BookingRejected.date_full(booking)
+
+def insert_booking(db, booking, overbooking=None):
+    """Menyimpan satu pesanan tanpa commit dan mengembalikan id-nya.
+
+    Melempar BookingRejected jika tanggal sudah penuh dan overbooking
+    (bawaan: konfigurasi OVERBOOKING) bernilai 'reject'; pemanggil wajib
+    me-rollback transaksinya. Jika idempotency_key pesanan sudah pernah
+    disimpan, id pesanan lama yang dikembalikan tanpa menulis apa pun.
+    """
+    if booking.get('idempotency_key'):
+        row = db.execute('SELECT id FROM bookings WHERE idempotency_key = ?',
+                         (booking['idempotency_key'],)).fetchone()
+        if row is not None:
+            metrics.inc('duplicate_submissions_total')
+            return row[0]
+
+    # Slot dipesan lebih dulu dengan satu UPSERT pada primary key, sehingga
+    # pemeriksaan dan penambahan terjadi atomik di bawah kunci tulis.
+    terisi = db.execute(
+        'INSERT INTO availability (tanggal, package_id, terisi) VALUES (?, ?, 1) '
+        'ON CONFLICT (tanggal, package_id) DO UPDATE SET terisi = terisi + 1 RETURNING terisi',
+        (booking['tanggal_acara'], booking['package_id'])
+    ).fetchone()[0]
+    # Kapasitas dibaca dari tabel di transaksi yang sama, bukan dari cache
+    # katalog, agar perubahan kapasitas oleh admin langsung berlaku.
+    capacity = db.execute('SELECT capacity FROM packages WHERE id = ?', (booking['package_id'],)).fetchone()[0]
+    if capacity is not None and terisi > capacity and (overbooking or current_app.config['OVERBOOKING']) == 'reject':
+        raise BookingRejected.date_full(booking)
+
+    cur = db.execute(
+        'INSERT INTO bookings (nama, email, telepon, tanggal_acara, package_id, layanan, pesan, idempotency_key) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (booking['nama'], booking['email'], booking['telepon'], booking['tanggal_acara'],
+         booking['package_id'], booking['layanan'], booking['pesan'], booking.get('idempotency_key'))
+    )
+    update_stats(db, {
+        ('status', 'Baru'): 1,
+        ('paket', booking['package_id']): 1,
+        ('bulan', booking['tanggal_acara'][:7]): 1,
+    })
+    enqueue_notifications(db, 'pesanan_baru', dict(booking, id=cur.lastrowid, status='Baru'))
+    return cur.lastrowid
+
+def update_stats(db, deltas):
+    """Menambahkan perubahan {(dimensi, kunci): delta} ke tabel booking_stats."""
+    db.executemany(
+        'INSERT INTO booking_stats (dimensi, kunci, jumlah) VALUES (?, ?, ?) '
+        'ON CONFLICT (dimensi, kunci) DO UPDATE SET jumlah = jumlah + excluded.jumlah',
+        [(dimensi, kunci, delta) for (dimensi, kunci), delta in deltas.items() if delta]
+    )
+
+def change_status(db, order_ids, status):
+    """Mengubah status pesanan tanpa commit; mengembalikan id yang benar-benar berubah.
+
+    Slot di tabel availability ikut disesuaikan, misalnya dibebaskan saat
+    pesanan menjadi 'Dibatalkan', begitu pula hitungan per status di
+    booking_stats. Notifikasi perubahan status ditulis ke outbox.
+    """
+    if not db.in_transaction:
+        # Status lama harus dibaca di bawah kunci tulis; dengan transaksi
+        # deferred dua perubahan bersamaan sama-sama melihat status lama dan
+        # availability/booking_stats terhitung dua kali.
+        db.execute('BEGIN IMMEDIATE')
+    placeholders = ', '.join('?' * len(order_ids))
+    rows = db.execute(
+        'SELECT id, nama, email, telepon, status, tanggal_acara, package_id, layanan '
+        'FROM bookings WHERE id IN (%s) AND status != ?' % placeholders,
+        list(order_ids) + [status]
+    ).fetchall()
+
+    db.executemany(
+        'UPDATE bookings SET status = ? WHERE id = ?',
+        [(status, row['id']) for row in rows]
+    )
+
+    deltas = {}
+    stats = {}
+    for row in rows:
+        old_status, slot = row['status'], (row['tanggal_acara'], row['package_id'])
+        delta = (status in ACTIVE_STATUSES) - (old_status in ACTIVE_STATUSES)
+        if delta and slot[1] is not None:
+            deltas[slot] = deltas.get(slot, 0) + delta
+        stats[('status', old_status)] = stats.get(('status', old_status), 0) - 1
+        stats[('status', status)] = stats.get(('status', status), 0) + 1
+        enqueue_notifications(db, 'status_berubah', dict(row, status=status))
+    update_stats(db, stats)
+    db.executemany(
+        'INSERT INTO availability (tanggal, package_id, terisi) VALUES (?, ?, ?) '
+        'ON CONFLICT (tanggal, package_id) DO UPDATE SET terisi = terisi + excluded.terisi',
+        [(tanggal, package_id, delta) for (tanggal, package_id), delta in deltas.items() if delta]
+    )
+    return [row['id'] for row in rows]
+
+# Kolom yang disalin apa adanya saat pesanan dipindahkan ke arsip
+BOOKING_COLUMNS = ['id', 'nama', 'email', 'telepon', 'tanggal_acara', 'package_id', 'layanan', 'pesan',
+                   'status', 'timestamp', 'idempotency_key']
+
+def archive_table(db):
+    """Nama lengkap tabel arsip yang terlihat oleh koneksi ini, atau None."""
+    for schema in ('arsip', 'main'):
+        try:
+            row = db.execute(
+                "SELECT 1 FROM %s.sqlite_master WHERE type = 'table' AND name = 'bookings_archive'" % schema
+            ).fetchone()
+        except sqlite3.OperationalError:
+            continue  # database arsip tidak di-ATTACH
+        if row is not None:
+            return '%s.bookings_archive' % schema
+    return None
+
+def all_bookings(db, columns):
+    """Sumber FROM untuk seluruh pesanan: tabel aktif digabung dengan arsip."""
+    archive = archive_table(db)
+    if archive is None:
+        return 'bookings'
+    columns = ', '.join(columns)
+    return '(SELECT %s FROM bookings UNION ALL SELECT %s FROM %s)' % (columns, columns, archive)
+
+def rebuild_availability(db):
+    """Menghitung ulang tabel availability dari seluruh pesanan, termasuk arsip."""
+    placeholders = ', '.join('?' * len(ACTIVE_STATUSES))
+    db.execute('DELETE FROM availability')
+    db.execute(
+        'INSERT INTO availability (tanggal, package_id, terisi) '
+        'SELECT tanggal_acara, package_id, COUNT(*) FROM %s '
+        'WHERE status IN (%s) AND package_id IS NOT NULL GROUP BY tanggal_acara, package_id'
+        % (all_bookings(db, ['tanggal_acara', 'package_id', 'status']), placeholders),
+        sorted(ACTIVE_STATUSES)
+    )
+
+def compute_stats(db):
+    """Menghitung ulang semua penghitung dashboard dengan GROUP BY (full scan).
+
+    Pesanan di arsip ikut dihitung: memindahkan pesanan ke arsip tidak
+    mengubah ringkasan dashboard.
+    """
+    stats = {}
+    source = all_bookings(db, ['status', 'package_id', 'tanggal_acara'])
+    for dimensi, expression in [('status', 'status'),
+                                ("paket", "COALESCE(package_id, '')"),
+                                ('bulan', 'substr(tanggal_acara, 1, 7)')]:
+        rows = db.execute(
+            'SELECT %s, COUNT(*) FROM %s GROUP BY 1' % (expression, source)
+        ).fetchall()
+        for kunci, jumlah in rows:
+            stats[(dimensi, kunci)] = jumlah
+    return stats
+
+def rebuild_stats(db):
+    """Mengisi ulang tabel booking_stats dari seluruh pesanan."""
+    db.execute('DELETE FROM booking_stats')
+    update_stats(db, compute_stats(db))
+
+def verify_stats(db):
+    """Membandingkan booking_stats dengan hasil hitung ulang.
+
+    Mengembalikan daftar (dimensi, kunci, tersimpan, seharusnya) yang berbeda.
+    """
+    expected = compute_stats(db)
+    stored = {
+        (dimensi, kunci): jumlah
+        for dimensi, kunci, jumlah in db.execute('SELECT dimensi, kunci, jumlah FROM booking_stats')
+    }
+    return [
+        key + (stored.get(key, 0), expected.get(key, 0))
+        for key in sorted(set(stored) | set(expected))
+        if stored.get(key, 0) != expected.get(key, 0)
+    ]
+
+def load_stats(db):
+    """Membaca ringkasan dashboard dari booking_stats (tabel kecil, tanpa scan)."""
+    summary = {'status': {}, 'paket': {}, 'bulan': {}}
+    for dimensi, kunci, jumlah in db.execute('SELECT dimensi, kunci, jumlah FROM booking_stats WHERE jumlah != 0'):
+        summary.setdefault(dimensi, {})[kunci] = jumlah
+    return summary
+
+def seed_packages(db):
+    """Mengisi tabel packages dengan DEFAULT_PACKAGES (yang belum ada saja)."""
+    db.executemany(
+        'INSERT OR IGNORE INTO packages (id, name, description, price, features, capacity, icon, position) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [(pkg['id'], pkg['name'], pkg['description'], pkg['price'], json.dumps(pkg['features']),
+          pkg['capacity'], pkg['icon'], position) for position, pkg in enumerate(DEFAULT_PACKAGES)]
+    )
+
+# --- MIGRASI SCHEMA ---
+
+# Setiap migrasi adalah (versi, langkah). Langkah berupa skrip SQL atau
+# fungsi yang menerima koneksi. Migrasi yang sudah dirilis tidak diubah
+# lagi; karena itu pengisian ulang data ditulis sebagai SQL beku di dalam
+# migrasinya, bukan memanggil rebuild_*() yang isinya ikut berkembang
+# bersama aplikasi. Versi yang sudah diterapkan disimpan di
+# PRAGMA user_version, jadi setiap proses cukup membaca satu angka itu.
+# Semua perintah memakai IF NOT EXISTS agar database yang dibuat sebelum
+# ada sistem migrasi (user_version 0) tetap bisa dinaikkan dengan aman.
+MIGRATIONS = [
+    (1, ["""
 CREATE TABLE IF NOT EXISTS bookings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     nama TEXT NOT NULL,
@@ -60,20 +799,319 @@ CREATE TABLE IF NOT EXISTS bookings (
     status TEXT NOT NULL DEFAULT 'Baru',
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
 );
+"""]),
+    # Indeks untuk paginasi keyset dashboard admin: urutan (timestamp, id)
+    # bisa dibaca langsung dari indeks, dengan atau tanpa filter.
+    (2, ["""
+CREATE INDEX IF NOT EXISTS idx_bookings_timestamp ON bookings (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_layanan ON bookings (layanan, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_tanggal ON bookings (tanggal_acara);
+"""]),
+    # Jumlah pesanan aktif per tanggal acara dan layanan. Dijaga tetap sinkron
+    # oleh insert_booking() dan change_status(), sehingga pemeriksaan
+    # ketersediaan cukup satu lookup primary key.
+    (3, ["""
+CREATE TABLE IF NOT EXISTS availability (
+    tanggal TEXT NOT NULL,
+    layanan TEXT NOT NULL,
+    terisi INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tanggal, layanan)
+) WITHOUT ROWID;
+
+DELETE FROM availability;
+INSERT INTO availability (tanggal, layanan, terisi)
+SELECT tanggal_acara, layanan, COUNT(*) FROM bookings
+WHERE status IN ('Baru', 'Dikonfirmasi', 'Selesai') GROUP BY tanggal_acara, layanan;
+"""]),
+    # Penghitung ringkasan dashboard, diperbarui di transaksi yang sama dengan
+    # INSERT/UPDATE pesanan. dimensi: 'status', 'layanan' atau 'bulan'
+    # (bulan acara, YYYY-MM). Dicek/dibangun ulang dengan `flask stats`.
+    (4, ["""
+CREATE TABLE IF NOT EXISTS booking_stats (
+    dimensi TEXT NOT NULL,
+    kunci TEXT NOT NULL,
+    jumlah INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimensi, kunci)
+) WITHOUT ROWID;
+
+DELETE FROM booking_stats;
+INSERT INTO booking_stats (dimensi, kunci, jumlah)
+SELECT 'status', status, COUNT(*) FROM bookings GROUP BY status;
+INSERT INTO booking_stats (dimensi, kunci, jumlah)
+SELECT 'layanan', layanan, COUNT(*) FROM bookings GROUP BY layanan;
+INSERT INTO booking_stats (dimensi, kunci, jumlah)
+SELECT 'bulan', substr(tanggal_acara, 1, 7), COUNT(*) FROM bookings GROUP BY 2;
+"""]),
+    # Indeks teks penuh untuk pencarian pelanggan di dashboard. Isinya diambil
+    # dari tabel bookings (external content) dan dijaga sinkron oleh trigger.
+    (5, ["""
+CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+    nama, email, telepon, pesan,
+    content='bookings', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS bookings_fts_insert AFTER INSERT ON bookings BEGIN
+    INSERT INTO bookings_fts (rowid, nama, email, telepon, pesan)
+    VALUES (new.id, new.nama, new.email, new.telepon, new.pesan);
+END;
+
+CREATE TRIGGER IF NOT EXISTS bookings_fts_delete AFTER DELETE ON bookings BEGIN
+    INSERT INTO bookings_fts (bookings_fts, rowid, nama, email, telepon, pesan)
+    VALUES ('delete', old.id, old.nama, old.email, old.telepon, old.pesan);
+END;
+
+CREATE TRIGGER IF NOT EXISTS bookings_fts_update AFTER UPDATE OF nama, email, telepon, pesan ON bookings BEGIN
+    INSERT INTO bookings_fts (bookings_fts, rowid, nama, email, telepon, pesan)
+    VALUES ('delete', old.id, old.nama, old.email, old.telepon, old.pesan);
+    INSERT INTO bookings_fts (rowid, nama, email, telepon, pesan)
+    VALUES (new.id, new.nama, new.email, new.telepon, new.pesan);
+END;
+
+INSERT INTO bookings_fts (bookings_fts) VALUES ('rebuild');
+"""]),
+    # Outbox notifikasi: ditulis di transaksi yang sama dengan pesanan,
+    # lalu dikirim oleh NotificationDispatcher. next_attempt_at (epoch)
+    # juga berfungsi sebagai lease ketika pesan sedang dikirim.
+    (6, ["""
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_id INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'menunggu',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at);
+"""]),
+    # Katalog paket di database. Setiap perubahan pada packages menaikkan
+    # meta.catalog_version lewat trigger; worker membandingkan angka itu
+    # dengan salinan katalog di memori (lihat get_catalog()). Pesanan kini
+    # merujuk paket lewat package_id; kolom layanan tetap menyimpan nama
+    # paket saat dipesan. availability dan booking_stats dikunci per id.
+    (7, ["""
+CREATE TABLE IF NOT EXISTS packages (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    price TEXT NOT NULL DEFAULT '',
+    features TEXT NOT NULL DEFAULT '[]',
+    capacity INTEGER,
+    icon TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_version', 1);
+
+CREATE TRIGGER IF NOT EXISTS packages_version_insert AFTER INSERT ON packages BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'catalog_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS packages_version_update AFTER UPDATE ON packages BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'catalog_version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS packages_version_delete AFTER DELETE ON packages BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'catalog_version';
+END;
+""", seed_packages, """
+ALTER TABLE bookings ADD COLUMN package_id TEXT REFERENCES packages (id);
+
+UPDATE bookings SET package_id = (SELECT id FROM packages WHERE packages.name = bookings.layanan);
+
+DROP INDEX IF EXISTS idx_bookings_layanan;
+CREATE INDEX IF NOT EXISTS idx_bookings_package ON bookings (package_id, timestamp, id);
+
+DROP TABLE IF EXISTS availability;
+CREATE TABLE availability (
+    tanggal TEXT NOT NULL,
+    package_id TEXT NOT NULL,
+    terisi INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tanggal, package_id)
+) WITHOUT ROWID;
+
+INSERT INTO availability (tanggal, package_id, terisi)
+SELECT tanggal_acara, package_id, COUNT(*) FROM bookings
+WHERE status IN ('Baru', 'Dikonfirmasi', 'Selesai') AND package_id IS NOT NULL
+GROUP BY tanggal_acara, package_id;
+
+DELETE FROM booking_stats;
+INSERT INTO booking_stats (dimensi, kunci, jumlah)
+SELECT 'status', status, COUNT(*) FROM bookings GROUP BY status;
+INSERT INTO booking_stats (dimensi, kunci, jumlah)
+SELECT 'paket', COALESCE(package_id, ''), COUNT(*) FROM bookings GROUP BY 2;
+INSERT INTO booking_stats (dimensi, kunci, jumlah)
+SELECT 'bulan', substr(tanggal_acara, 1, 7), COUNT(*) FROM bookings GROUP BY 2;
+"""]),
+    # Kunci idempotensi dari formulir pemesanan: pengiriman ulang dengan
+    # kunci yang sama dikenali lewat satu lookup indeks, bukan disimpan dua kali.
+    (8, ["""
+ALTER TABLE bookings ADD COLUMN idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency ON bookings (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+"""]),
+    # Pencarian kandidat arsip (status tertutup + tanggal acara lama) tanpa
+    # menelusuri semua pesanan Selesai/Dibatalkan lewat idx_bookings_status.
+    (9, ["""
+CREATE INDEX IF NOT EXISTS idx_bookings_status_tanggal ON bookings (status, tanggal_acara);
+"""]),
+    # Dashboard dengan rentang tanggal acara dipaginasi menurut
+    # (tanggal_acara, id); indeks ini melayani rentang itu bersama filter
+    # paket. Filter status memakai idx_bookings_status_tanggal, tanpa filter
+    # lain idx_bookings_tanggal (rowid ikut tersimpan di setiap indeks).
+    (10, ["""
+CREATE INDEX IF NOT EXISTS idx_bookings_package_tanggal ON bookings (package_id, tanggal_acara);
+"""]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def split_sql(script):
+    """Memecah skrip SQL menjadi perintah tunggal (aman untuk isi trigger)."""
+    statements, current = [], ''
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ''
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+def migrate_db(config):
+    """Menerapkan migrasi yang tertunda dan mengembalikan versi schema.
+
+    Jika database sudah versi terbaru, fungsi ini hanya membaca
+    PRAGMA user_version. Semua migrasi yang tertunda dijalankan dalam satu
+    transaksi, dan versinya diperiksa ulang setelah kunci tulis didapat
+    agar beberapa worker yang start bersamaan tidak bermigrasi dua kali.
+    """
+    db = connect_db(config, isolation_level=None)
+    try:
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return version
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            version = db.execute('PRAGMA user_version').fetchone()[0]
+            for number, steps in MIGRATIONS:
+                if number <= version:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(db)
+                    else:
+                        for statement in split_sql(step):
+                            db.execute(statement)
+                db.execute('PRAGMA user_version = %d' % number)
+                version = number
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return version
+    finally:
+        db.close()
+
+# Tabel arsip tidak masuk MIGRATIONS karena bisa berada di file lain
+# (ARCHIVE_DATABASE). Kolomnya sama dengan bookings ditambah archived_at,
+# dengan indeks teks penuh sendiri agar arsip tetap bisa dicari.
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.bookings_archive (
+    id INTEGER PRIMARY KEY,
+    nama TEXT NOT NULL,
+    email TEXT NOT NULL,
+    telepon TEXT NOT NULL,
+    tanggal_acara TEXT NOT NULL,
+    package_id TEXT,
+    layanan TEXT NOT NULL,
+    pesan TEXT,
+    status TEXT NOT NULL,
+    timestamp DATETIME,
+    idempotency_key TEXT,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS {schema}.idx_archive_timestamp ON bookings_archive (timestamp, id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.bookings_archive_fts USING fts5(
+    nama, email, telepon, pesan,
+    content='bookings_archive', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS {schema}.bookings_archive_fts_insert AFTER INSERT ON bookings_archive BEGIN
+    INSERT INTO bookings_archive_fts (rowid, nama, email, telepon, pesan)
+    VALUES (new.id, new.nama, new.email, new.telepon, new.pesan);
+END;
+
+CREATE TRIGGER IF NOT EXISTS {schema}.bookings_archive_fts_delete AFTER DELETE ON bookings_archive BEGIN
+    INSERT INTO bookings_archive_fts (bookings_archive_fts, rowid, nama, email, telepon, pesan)
+    VALUES ('delete', old.id, old.nama, old.email, old.telepon, old.pesan);
+END;
 """
-# Menulis schema ke file agar bisa dibaca oleh init_db()
-with open('schema.sql', 'w') as f:
-    f.write(schema_sql)
+
+def migrate_archive(config):
+    """Membuat tabel arsip jika belum ada (di 'arsip' jika ARCHIVE_DATABASE diatur)."""
+    db = connect_db(config, isolation_level=None)
+    try:
+        if archive_table(db) is not None:
+            return
+        schema = 'arsip' if config['ARCHIVE_DATABASE'] else 'main'
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in split_sql(ARCHIVE_SCHEMA.format(schema=schema)):
+                db.execute(statement)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+    finally:
+        db.close()
+
+def init_db():
+    """Menerapkan migrasi schema yang tertunda untuk aplikasi aktif."""
+    state = get_state()
+    with state.lock:
+        version = migrate_db(current_app.config)
+        migrate_archive(current_app.config)
+        state.schema_ready = True
+    return version
 
 
 # --- DATA PAKET FOTOGRAFI ---
-PACKAGES = [
+
+STATUSES = ['Baru', 'Dikonfirmasi', 'Selesai', 'Dibatalkan']
+# Status yang memakai slot tanggal; 'Dibatalkan' membebaskannya
+ACTIVE_STATUSES = {'Baru', 'Dikonfirmasi', 'Selesai'}
+
+# Isi awal tabel packages (migrasi 7). Setelah itu katalog dikelola dari
+# /admin/paket; daftar ini jangan diubah karena ikut menentukan hasil
+# migrasi 7 pada database baru. "capacity" adalah jumlah maksimum pesanan aktif per tanggal
+# untuk paket itu; kosong berarti tanpa batas.
+
+DEFAULT_PACKAGES = [
     {
         "id": "pernikahan",
         "name": "Paket Pernikahan",
         "description": "Abadikan setiap momen sakral di hari bahagia Anda dengan hasil yang sinematik dan tak terlupakan.",
         "price": "Mulai dari Rp 5.500.000",
         "features": ["8 Jam Liputan", "2 Fotografer", "1 Album Kolase Eksklusif", "Semua File Diberikan"],
+        "capacity": 1,
         "icon": """<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="w-8 h-8 mb-4 text-pink-500"><path d="M20.42 4.58a5.4 5.4 0 0 0-7.65 0l-.77.77-.77-.77a5.4 5.4 0 0 0-7.65 0C2.46 6.51 2 8.6 2 10.5c0 3.86 3.42 8.58 10 11.5 6.58-2.92 10-7.64 10-11.5 0-1.9-.46-3.99-1.58-5.92z"></path></svg>"""
     },
     {
@@ -82,6 +1120,7 @@ PACKAGES = [
         "description": "Ceritakan kisah cinta Anda melalui sesi foto pre-wedding yang kreatif dan personal di lokasi pilihan Anda.",
         "price": "Mulai dari Rp 2.800.000",
         "features": ["4 Jam Sesi Foto", "1 Fotografer", "25 Foto Edit Terbaik", "Cetak 2 Foto 16R"],
+        "capacity": 2,
         "icon": """<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="w-8 h-8 mb-4 text-blue-500"><path d="M12 2a3.12 3.12 0 0 1 3 3.12V18a3.12 3.12 0 0 1-3 3.12v0a3.12 3.12 0 0 1-3-3.12V5.12A3.12 3.12 0 0 1 12 2z"></path><path d="M12 2a3.12 3.12 0 0 0-3 3.12V18a3.12 3.12 0 0 0 3 3.12v0a3.12 3.12 0 0 0 3-3.12V5.12A3.12 3.12 0 0 0 12 2z"></path><path d="M12 22a3.12 3.12 0 0 1 3-3.12V5.12a3.12 3.12 0 0 1-3-3.12v0a3.12 3.12 0 0 1-3 3.12v13.76A3.12 3.12 0 0 1 12 22z"></path><path d="M12 22a3.12 3.12 0 0 0 3-3.12V5.12a3.12 3.12 0 0 0-3-3.12v0a3.12 3.12 0 0 0-3 3.12v13.76A3.12 3.12 0 0 0 12 22z"></path></svg>"""
     },
     {
@@ -90,6 +1129,7 @@ PACKAGES = [
         "description": "Liputan untuk berbagai acara penting seperti ulang tahun, lamaran, atau acara perusahaan.",
         "price": "Mulai dari Rp 1.500.000",
         "features": ["3 Jam Liputan", "1 Fotografer", "75+ Foto Edit", "Link Google Drive"],
+        "capacity": 2,
         "icon": """<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="w-8 h-8 mb-4 text-green-500"><path d="M19 21v-2a4 4 0 0 0-4-4H9a4 4 0 0 0-4 4v2"></path><circle cx="12" cy="7" r="4"></circle></svg>"""
     },
     {
@@ -98,12 +1138,69 @@ PACKAGES = [
         "description": "Rayakan kelulusan Anda dengan foto yang elegan dan penuh kenangan bersama keluarga dan teman.",
         "price": "Mulai dari Rp 1.500.000",
         "features": ["2 Jam Sesi Foto", "1 Fotografer", "20 Foto Edit Terbaik", "Cetak 1 Foto 12R + Frame"],
+        "capacity": 3,
         "icon": """<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="w-8 h-8 mb-4 text-purple-500"><path d="M22 10v6M2 10l10-5 10 5-10 5z"></path><path d="M6 12v5c0 1.66 4 3 6 3s6-1.34 6-3v-5"></path></svg>"""
     }
 ]
 
+
+class PackageCatalog:
+    """Salinan tabel packages di memori, diindeks berdasarkan id."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.by_id = {}
+        for row in rows:
+            pkg = dict(row)
+            pkg['features'] = json.loads(pkg['features'])
+            pkg['active'] = bool(pkg['active'])
+            self.by_id[pkg['id']] = pkg
+        self.active = [pkg for pkg in self.by_id.values() if pkg['active']]
+        self.names = {package_id: pkg['name'] for package_id, pkg in self.by_id.items()}
+
+    def get(self, package_id):
+        return self.by_id.get(package_id)
+
+
+def get_catalog():
+    """Katalog paket untuk request ini, dimuat ulang hanya jika versinya berubah.
+
+    Setiap request cukup membaca meta.catalog_version (satu lookup primary
+    key), sekali saja berkat cache di g. Versi itu dinaikkan oleh trigger,
+    sehingga perubahan dari worker lain pun terlihat di request berikutnya.
+    Ketika katalog dimuat ulang, cache halaman ikut dikosongkan.
+    """
+    if 'catalog' in g:
+        return g.catalog
+    state = get_state()
+    db = get_db()
+    version = db.execute("SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()[0]
+    catalog = state.catalog
+    if catalog is None or catalog.version != version:
+        catalog = PackageCatalog(version, db.execute('SELECT * FROM packages ORDER BY position, name').fetchall())
+        with state.lock:
+            state.catalog = catalog
+            state.page_cache.clear()
+    g.catalog = catalog
+    return catalog
+
 # --- TEMPLATE HTML ---
 
+# Bagian <head> bersama: CSS dan font hasil build jika ada, selain itu CDN.
+ASSETS_TEMPLATE = """
+{%- if asset_url('app.css') %}
+    {%- for font in preload_fonts() %}
+    <link rel="preload" href="{{ font }}" as="font" type="font/woff2" crossorigin>
+    {%- endfor %}
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+{%- else %}
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link rel="preconnect" href="https://fonts.googleapis.com">
+    <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap" rel="stylesheet">
+{%- endif %}
+"""
+
 HOME_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="id" class="scroll-smooth">
@@ -111,10 +1208,7 @@ HOME_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Fotografi Profesional - Abadikan Momen Anda</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link rel="preconnect" href="https://fonts.googleapis.com">
-    <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap" rel="stylesheet">
+    {% include '_assets.html' %}
     <style>
         body { font-family: 'Inter', sans-serif; }
         .hero-bg { background-image: linear-gradient(to right, rgba(0,0,0,0.6), rgba(0,0,0,0.2)), url('https://placehold.co/1600x900/a3a3a3/ffffff?text=Momen+Indah'); background-size: cover; background-position: center; }
@@ -168,6 +1262,22 @@ HOME_TEMPLATE = """
         <section id="galeri" class="py-20">
             <div class="container mx-auto px-6 text-center">
                 <h2 class="text-3xl md:text-4xl font-bold mb-12">Galeri Portofolio</h2>
+                {% if gallery %}
+                <div class="grid grid-cols-2 md:grid-cols-4 gap-4">
+                    {% for column in gallery | slice(4) %}
+                    <div class="grid gap-4 content-start">
+                        {% for photo in column %}
+                        <div>
+                            <picture>
+                                <source type="image/webp" srcset="{{ photo_srcset(photo, 'webp') }}" sizes="{{ photo_sizes }}">
+                                <img class="h-auto max-w-full rounded-lg shadow-md transition-transform duration-300 hover:scale-105" src="{{ photo_src(photo, 'jpeg') }}" srcset="{{ photo_srcset(photo, 'jpeg') }}" sizes="{{ photo_sizes }}" width="{{ photo.width }}" height="{{ photo.height }}" loading="lazy" decoding="async" alt="{{ photo.alt }}">
+                            </picture>
+                        </div>
+                        {% endfor %}
+                    </div>
+                    {% endfor %}
+                </div>
+                {% else %}
                 <div class="grid grid-cols-2 md:grid-cols-4 gap-4">
                     <div class="grid gap-4">
                         <div><img class="h-auto max-w-full rounded-lg shadow-md transition-transform duration-300 hover:scale-105" src="https://placehold.co/500x700/e2e8f0/334155?text=Foto+1" alt="Foto Pernikahan"></div>
@@ -186,6 +1296,7 @@ HOME_TEMPLATE = """
                         <div><img class="h-auto max-w-full rounded-lg shadow-md transition-transform duration-300 hover:scale-105" src="https://placehold.co/500x600/e2e8f0/334155?text=Foto+8" alt="Indoor Shot"></div>
                     </div>
                 </div>
+                {% endif %}
             </div>
         </section>
         <section id="pesan" class="py-20 bg-white">
@@ -194,7 +1305,11 @@ HOME_TEMPLATE = """
                     <h2 class="text-3xl md:text-4xl font-bold mb-4">Pesan Jasa Kami</h2>
                     <p class="text-gray-600 mb-8">Isi formulir di bawah ini untuk konsultasi atau pemesanan. Tim kami akan segera menghubungi Anda.</p>
                 </div>
-                <form action="/submit" method="post" class="max-w-2xl mx-auto bg-gray-50 p-8 rounded-xl shadow-lg border border-gray-200">
+                <form id="form-pesan" action="/submit" method="post" class="max-w-2xl mx-auto bg-gray-50 p-8 rounded-xl shadow-lg border border-gray-200">
+                    <input type="hidden" name="idempotency_key" id="idempotency_key">
+                    {% if error %}
+                    <p class="bg-red-100 border border-red-400 text-red-700 px-4 py-3 rounded mb-6" role="alert">{{ error }}</p>
+                    {% endif %}
                     <div class="grid grid-cols-1 md:grid-cols-2 gap-6 mb-6">
                         <div>
                             <label for="nama" class="block text-sm font-medium text-gray-700 mb-1">Nama Lengkap</label>
@@ -213,6 +1328,7 @@ HOME_TEMPLATE = """
                         <div>
                             <label for="tanggal_acara" class="block text-sm font-medium text-gray-700 mb-1">Tanggal Acara</label>
                             <input type="date" id="tanggal_acara" name="tanggal_acara" required class="w-full border-gray-300 rounded-lg shadow-sm focus:ring-blue-500 focus:border-blue-500">
+                            <p id="tanggal-penuh" class="hidden text-sm text-red-600 mt-1">Tanggal ini sudah penuh untuk paket yang dipilih.</p>
                         </div>
                     </div>
                     <div class="mb-6">
@@ -240,6 +1356,51 @@ HOME_TEMPLATE = """
             <p>&copy; 2025 FotografiKu. Semua Hak Cipta Dilindungi.</p>
         </div>
     </footer>
+    <script>
+        // Kunci idempotensi dibuat di browser (halaman ini di-cache dan sama
+        // untuk semua pengunjung). Klik ganda atau kirim ulang memakai kunci
+        // yang sama; kunci baru dibuat jika halaman dipulihkan dari cache
+        // "back" browser, karena itu berarti pesanan baru.
+        const keyInput = document.getElementById('idempotency_key');
+        function newIdempotencyKey() {
+            keyInput.value = window.crypto && crypto.randomUUID
+                ? crypto.randomUUID()
+                : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+        }
+        const submitButton = document.querySelector('#form-pesan button[type="submit"]');
+        newIdempotencyKey();
+        window.addEventListener('pageshow', event => {
+            if (event.persisted) {
+                newIdempotencyKey();
+                submitButton.disabled = false;
+            }
+        });
+        document.getElementById('form-pesan').addEventListener('submit', () => { submitButton.disabled = true; });
+
+        // Menandai tanggal yang sudah penuh berdasarkan /availability.
+        const dateInput = document.getElementById('tanggal_acara');
+        const packageSelect = document.getElementById('layanan');
+        const fullNotice = document.getElementById('tanggal-penuh');
+        const months = {};
+
+        async function checkAvailability() {
+            const date = dateInput.value;
+            const pkg = packageSelect.value;
+            let full = false;
+            if (date && pkg) {
+                const month = date.slice(0, 7);
+                if (!months[month]) {
+                    months[month] = fetch('/availability?month=' + month).then(r => r.json());
+                }
+                const data = await months[month];
+                full = (data.full[pkg] || []).includes(date);
+            }
+            dateInput.setCustomValidity(full ? fullNotice.textContent : '');
+            fullNotice.classList.toggle('hidden', !full);
+        }
+        dateInput.addEventListener('change', checkAvailability);
+        packageSelect.addEventListener('change', checkAvailability);
+    </script>
 </body>
 </html>
 """
@@ -251,8 +1412,7 @@ SUCCESS_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Permintaan Terkirim!</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap" rel="stylesheet">
+    {% include '_assets.html' %}
     <style> body { font-family: 'Inter', sans-serif; } </style>
 </head>
 <body class="bg-gray-100 flex items-center justify-center h-screen">
@@ -273,8 +1433,7 @@ LOGIN_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Admin Login</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap" rel="stylesheet">
+    {% include '_assets.html' %}
     <style> body { font-family: 'Inter', sans-serif; } </style>
 </head>
 <body class="bg-gray-100 flex items-center justify-center h-screen">
@@ -308,8 +1467,7 @@ ADMIN_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Dashboard Admin - Pesanan Fotografi</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
+    {% include '_assets.html' %}
     <style>
         body { font-family: 'Inter', sans-serif; }
         .status-baru { background-color: #e0f2fe; color: #0c4a6e; }
@@ -322,30 +1480,124 @@ ADMIN_TEMPLATE = """
     <div class="container mx-auto p-4 sm:p-6 lg:p-8">
         <header class="flex justify-between items-center mb-8">
             <h1 class="text-4xl font-bold text-gray-800">Dashboard Pesanan</h1>
-            <a href="/admin/logout" class="bg-red-600 text-white font-semibold px-5 py-2 rounded-lg hover:bg-red-700 transition-colors">Logout</a>
+            <div class="flex items-center gap-3">
+                <a href="{{ url_for('.export_csv', **filters) }}" class="bg-white text-gray-700 font-semibold px-4 py-2 rounded-lg shadow hover:bg-gray-50 transition-colors">Ekspor CSV</a>
+                <a href="{{ url_for('.export_jsonl', **filters) }}" class="bg-white text-gray-700 font-semibold px-4 py-2 rounded-lg shadow hover:bg-gray-50 transition-colors">Ekspor JSONL</a>
+                <a href="{{ url_for('.admin_packages') }}" class="bg-white text-gray-700 font-semibold px-4 py-2 rounded-lg shadow hover:bg-gray-50 transition-colors">Kelola Paket</a>
+                <a href="/admin/logout" class="bg-red-600 text-white font-semibold px-5 py-2 rounded-lg hover:bg-red-700 transition-colors">Logout</a>
+            </div>
         </header>
-        
+
+        <section class="grid grid-cols-2 md:grid-cols-4 gap-4 mb-6">
+            {% for status in statuses %}
+            <div class="bg-white rounded-xl shadow-lg p-4">
+                <div class="text-xs font-semibold uppercase text-gray-500">{{ status }}</div>
+                <div class="text-3xl font-bold text-gray-800">{{ summary.status.get(status, 0) }}</div>
+            </div>
+            {% endfor %}
+        </section>
+        <section class="grid grid-cols-1 md:grid-cols-2 gap-4 mb-6 text-sm">
+            <div class="bg-white rounded-xl shadow-lg p-4">
+                <h2 class="font-semibold text-gray-700 mb-2">Pesanan per Paket</h2>
+                <ul class="space-y-1">
+                    {% for package_id, jumlah in summary.paket | dictsort %}
+                    <li class="flex justify-between"><span>{{ package_names.get(package_id) or 'Tanpa paket' }}</span><span class="font-semibold">{{ jumlah }}</span></li>
+                    {% endfor %}
+                </ul>
+            </div>
+            <div class="bg-white rounded-xl shadow-lg p-4">
+                <h2 class="font-semibold text-gray-700 mb-2">Pesanan per Bulan Acara</h2>
+                <ul class="space-y-1">
+                    {% for bulan, jumlah in (summary.bulan | dictsort | reverse | list)[:12] %}
+                    <li class="flex justify-between"><span>{{ bulan }}</span><span class="font-semibold">{{ jumlah }}</span></li>
+                    {% endfor %}
+                </ul>
+            </div>
+        </section>
+        <form action="{{ url_for('.upload_portfolio') }}" method="post" enctype="multipart/form-data" class="bg-white rounded-xl shadow-lg p-4 mb-6 flex flex-wrap items-center gap-4 text-sm">
+            <h2 class="font-semibold text-gray-700">Galeri Portofolio <span class="font-normal text-gray-500">({{ gallery | length }} foto tampil)</span></h2>
+            <input type="file" name="foto" accept="image/jpeg,image/png,image/webp" multiple required class="text-sm">
+            <button type="submit" class="bg-blue-600 text-white font-semibold px-4 py-2 rounded-md hover:bg-blue-700">Unggah</button>
+            <span class="text-xs text-gray-500">Foto diproses di latar belakang dan muncul di halaman utama setelah selesai.</span>
+        </form>
+
+        <nav class="flex gap-2 mb-4 text-sm font-semibold">
+            <a href="/admin" class="px-4 py-2 rounded-lg {% if archived %}bg-white text-gray-600 hover:bg-gray-50{% else %}bg-blue-600 text-white{% endif %}">Pesanan Aktif</a>
+            <a href="/admin?scope=arsip" class="px-4 py-2 rounded-lg {% if archived %}bg-blue-600 text-white{% else %}bg-white text-gray-600 hover:bg-gray-50{% endif %}">Arsip</a>
+        </nav>
+
+        <form action="/admin" method="get" class="bg-white rounded-xl shadow-lg p-4 mb-6 flex flex-wrap items-end gap-4 text-sm">
+            {% if archived %}<input type="hidden" name="scope" value="arsip">{% endif %}
+            <div class="flex-grow">
+                <label for="filter-q" class="block text-xs font-semibold text-gray-600 mb-1">Cari Pelanggan</label>
+                <input type="search" id="filter-q" name="q" value="{{ search }}" placeholder="Nama, email, telepon, atau isi pesan" class="w-full border-gray-300 rounded-md shadow-sm text-sm">
+            </div>
+            <div>
+                <label for="filter-status" class="block text-xs font-semibold text-gray-600 mb-1">Status</label>
+                <select id="filter-status" name="status" class="border-gray-300 rounded-md shadow-sm text-sm">
+                    <option value="">Semua</option>
+                    {% for status in statuses %}
+                    <option value="{{ status }}" {% if filters.status == status %}selected{% endif %}>{{ status }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            <div>
+                <label for="filter-layanan" class="block text-xs font-semibold text-gray-600 mb-1">Layanan</label>
+                <select id="filter-layanan" name="layanan" class="border-gray-300 rounded-md shadow-sm text-sm">
+                    <option value="">Semua</option>
+                    {% for pkg in packages %}
+                    <option value="{{ pkg.id }}" {% if filters.layanan == pkg.id %}selected{% endif %}>{{ pkg.name }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            <div>
+                <label for="filter-dari" class="block text-xs font-semibold text-gray-600 mb-1">Tanggal Acara Dari</label>
+                <input type="date" id="filter-dari" name="tanggal_dari" value="{{ filters.tanggal_dari }}" class="border-gray-300 rounded-md shadow-sm text-sm">
+            </div>
+            <div>
+                <label for="filter-sampai" class="block text-xs font-semibold text-gray-600 mb-1">Sampai</label>
+                <input type="date" id="filter-sampai" name="tanggal_sampai" value="{{ filters.tanggal_sampai }}" class="border-gray-300 rounded-md shadow-sm text-sm">
+            </div>
+            <button type="submit" class="bg-blue-600 text-white font-semibold px-4 py-2 rounded-lg hover:bg-blue-700">Terapkan</button>
+            <a href="{{ '/admin?scope=arsip' if archived else '/admin' }}" class="text-gray-500 hover:text-gray-700 py-2">Reset</a>
+        </form>
+
+        {% if not archived %}
+        <div id="bulk-bar" class="bg-white rounded-xl shadow-lg p-4 mb-6 flex flex-wrap items-center gap-4 text-sm">
+            <span><strong id="bulk-count">0</strong> pesanan dipilih</span>
+            <select id="bulk-status" class="border-gray-300 rounded-md shadow-sm text-sm">
+                {% for status in statuses %}
+                <option value="{{ status }}">{{ status }}</option>
+                {% endfor %}
+            </select>
+            <button type="button" id="bulk-apply" class="bg-blue-500 text-white px-4 py-2 rounded-lg font-semibold hover:bg-blue-600 disabled:opacity-50" disabled>Ubah Status</button>
+            <span id="bulk-message" class="text-gray-500"></span>
+        </div>
+        {% endif %}
+
         <div class="bg-white rounded-xl shadow-lg overflow-hidden">
             <div class="overflow-x-auto">
                 <table class="min-w-full text-sm text-left text-gray-600">
                     <thead class="text-xs text-gray-700 uppercase bg-gray-100">
                         <tr>
+                            {% if not archived %}<th scope="col" class="pl-6 py-3"><input type="checkbox" id="bulk-select-all" aria-label="Pilih semua"></th>{% endif %}
                             <th scope="col" class="px-6 py-3">ID</th>
                             <th scope="col" class="px-6 py-3">Pelanggan</th>
                             <th scope="col" class="px-6 py-3">Kontak</th>
                             <th scope="col" class="px-6 py-3">Detail Acara</th>
                             <th scope="col" class="px-6 py-3">Status</th>
-                            <th scope="col" class="px-6 py-3">Aksi</th>
+                            <th scope="col" class="px-6 py-3">{{ 'Diarsipkan' if archived else 'Aksi' }}</th>
                         </tr>
                     </thead>
                     <tbody>
                         {% if not orders %}
                         <tr>
-                            <td colspan="6" class="text-center py-10 text-gray-500">Belum ada pesanan yang masuk.</td>
+                            <td colspan="7" class="text-center py-10 text-gray-500">{{ 'Arsip masih kosong.' if archived else 'Belum ada pesanan yang masuk.' }}</td>
                         </tr>
                         {% endif %}
                         {% for order in orders %}
-                        <tr class="bg-white border-b hover:bg-gray-50">
+                        <tr class="bg-white border-b hover:bg-gray-50" data-order-id="{{ order.id }}">
+                            {% if not archived %}<td class="pl-6 py-4"><input type="checkbox" class="bulk-select" value="{{ order.id }}" aria-label="Pilih pesanan #{{ order.id }}"></td>{% endif %}
                             <td class="px-6 py-4 font-medium text-gray-900">#{{ order.id }}</td>
                             <td class="px-6 py-4">
                                 <div class="font-semibold">{{ order.nama }}</div>
@@ -355,12 +1607,18 @@ ADMIN_TEMPLATE = """
                             <td class="px-6 py-4">
                                 <div class="font-semibold">{{ order.layanan }}</div>
                                 <div class="text-xs text-gray-500">Tgl: {{ order.tanggal_acara }}</div>
+                                {% if (order.tanggal_acara, order.package_id) in overbooked and order.status != 'Dibatalkan' %}
+                                <div class="text-xs font-semibold text-red-600">Overbooked</div>
+                                {% endif %}
                             </td>
                             <td class="px-6 py-4">
-                                <span class="px-2 py-1 font-semibold leading-tight rounded-full text-xs status-{{ order.status | lower }}">
+                                <span data-status-badge class="px-2 py-1 font-semibold leading-tight rounded-full text-xs status-{{ order.status | lower }}">
                                     {{ order.status }}
                                 </span>
                             </td>
+                            {% if archived %}
+                            <td class="px-6 py-4 text-xs text-gray-500">{{ order.archived_at }}</td>
+                            {% else %}
                             <td class="px-6 py-4">
                                 <form action="/admin/update_status/{{ order.id }}" method="post" class="flex items-center gap-2">
                                     <select name="status" class="border-gray-300 rounded-md shadow-sm text-xs focus:ring-blue-500 focus:border-blue-500">
@@ -372,96 +1630,2249 @@ ADMIN_TEMPLATE = """
                                     <button type="submit" class="bg-blue-500 text-white px-3 py-1 rounded-md text-xs font-semibold hover:bg-blue-600">Update</button>
                                 </form>
                             </td>
+                            {% endif %}
                         </tr>
                         {% endfor %}
                     </tbody>
                 </table>
             </div>
         </div>
+
+        {% if search_error %}
+        <p class="text-sm text-red-600 mt-4">{{ search_error }}</p>
+        {% endif %}
+
+        <nav class="flex justify-between items-center mt-6 text-sm">
+            {% if first_url %}
+            <a href="{{ first_url }}" class="text-blue-600 font-semibold hover:underline">&larr; Halaman Pertama</a>
+            {% else %}
+            <span></span>
+            {% endif %}
+            {% if next_url %}
+            <a href="{{ next_url }}" class="text-blue-600 font-semibold hover:underline">Halaman Berikutnya &rarr;</a>
+            {% endif %}
+        </nav>
     </div>
+    {% if not archived %}
+    <script>
+        // Ubah status banyak pesanan sekaligus tanpa memuat ulang dashboard.
+        const boxes = Array.from(document.querySelectorAll('.bulk-select'));
+        const selectAll = document.getElementById('bulk-select-all');
+        const applyButton = document.getElementById('bulk-apply');
+        const message = document.getElementById('bulk-message');
+
+        function selectedIds() {
+            return boxes.filter(box => box.checked).map(box => box.value);
+        }
+        function refreshCount() {
+            const count = selectedIds().length;
+            document.getElementById('bulk-count').textContent = count;
+            applyButton.disabled = count === 0;
+        }
+        boxes.forEach(box => box.addEventListener('change', refreshCount));
+        selectAll.addEventListener('change', () => {
+            boxes.forEach(box => { box.checked = selectAll.checked; });
+            refreshCount();
+        });
+
+        applyButton.addEventListener('click', async () => {
+            const body = new FormData();
+            body.append('status', document.getElementById('bulk-status').value);
+            selectedIds().forEach(id => body.append('ids', id));
+            applyButton.disabled = true;
+            const response = await fetch('/admin/update_status/bulk', { method: 'POST', body });
+            const result = await response.json();
+            if (!response.ok) {
+                message.textContent = result.error;
+                refreshCount();
+                return;
+            }
+            result.ids.forEach(id => {
+                const row = document.querySelector('tr[data-order-id="' + id + '"]');
+                if (!row) return;
+                const badge = row.querySelector('[data-status-badge]');
+                badge.textContent = result.status;
+                badge.className = badge.className.replace(/status-\S+/, 'status-' + result.status.toLowerCase());
+                row.querySelector('select[name="status"]').value = result.status;
+                row.querySelector('.bulk-select').checked = false;
+            });
+            selectAll.checked = false;
+            message.textContent = result.updated + ' pesanan diubah menjadi ' + result.status + '.';
+            refreshCount();
+        });
+    </script>
+    {% endif %}
 </body>
 </html>
 """
 
-# --- ROUTING APLIKASI ---
+PACKAGES_ADMIN_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="id">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Kelola Paket - Admin</title>
+    {% include '_assets.html' %}
+    <style> body { font-family: 'Inter', sans-serif; } </style>
+</head>
+<body class="bg-gray-100">
+    <div class="container mx-auto p-4 sm:p-6 lg:p-8">
+        <header class="flex justify-between items-center mb-8">
+            <h1 class="text-4xl font-bold text-gray-800">Kelola Paket</h1>
+            <a href="{{ url_for('.admin_dashboard') }}" class="bg-white text-gray-700 font-semibold px-4 py-2 rounded-lg shadow hover:bg-gray-50 transition-colors">Kembali ke Dashboard</a>
+        </header>
 
-@app.route('/')
-def home():
-    """Menampilkan halaman utama."""
-    return render_template_string(HOME_TEMPLATE, packages=PACKAGES)
+        <div class="bg-white rounded-xl shadow-lg overflow-x-auto mb-8">
+            <table class="min-w-full text-sm text-left text-gray-600">
+                <thead class="text-xs text-gray-700 uppercase bg-gray-100">
+                    <tr>
+                        <th scope="col" class="px-6 py-3">Urutan</th>
+                        <th scope="col" class="px-6 py-3">Paket</th>
+                        <th scope="col" class="px-6 py-3">Harga</th>
+                        <th scope="col" class="px-6 py-3">Kapasitas/Hari</th>
+                        <th scope="col" class="px-6 py-3">Status</th>
+                        <th scope="col" class="px-6 py-3">Aksi</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for pkg in packages %}
+                    <tr class="border-b hover:bg-gray-50 {% if not pkg.active %}text-gray-400{% endif %}">
+                        <td class="px-6 py-4">{{ pkg.position }}</td>
+                        <td class="px-6 py-4"><div class="font-semibold">{{ pkg.name }}</div><div class="text-xs">{{ pkg.id }}</div></td>
+                        <td class="px-6 py-4">{{ pkg.price }}</td>
+                        <td class="px-6 py-4">{{ pkg.capacity if pkg.capacity is not none else 'Tanpa batas' }}</td>
+                        <td class="px-6 py-4">{{ 'Aktif' if pkg.active else 'Nonaktif' }}</td>
+                        <td class="px-6 py-4 flex gap-2">
+                            <a href="{{ url_for('.edit_package', package_id=pkg.id) }}" class="bg-blue-600 text-white px-3 py-1 rounded-md text-xs hover:bg-blue-700">Ubah</a>
+                            {% if pkg.active %}
+                            <form action="{{ url_for('.deactivate_package', package_id=pkg.id) }}" method="post">
+                                <button type="submit" class="bg-red-600 text-white px-3 py-1 rounded-md text-xs hover:bg-red-700">Nonaktifkan</button>
+                            </form>
+                            {% endif %}
+                        </td>
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+        </div>
 
-@app.route('/submit', methods=['POST'])
-def submit():
-    """Menyimpan data dari formulir ke database."""
-    if request.method == 'POST':
-        nama = request.form['nama']
-        email = request.form['email']
-        telepon = request.form['telepon']
-        tanggal_acara = request.form['tanggal_acara']
-        layanan_id = request.form['layanan']
-        pesan = request.form['pesan']
+        <form method="post" action="{{ url_for('.edit_package', package_id=editing.id) if editing else url_for('.admin_packages') }}" class="bg-white rounded-xl shadow-lg p-6 grid grid-cols-1 md:grid-cols-2 gap-4 text-sm">
+            <h2 class="md:col-span-2 text-xl font-bold text-gray-800">{{ 'Ubah Paket ' ~ editing.name if editing else 'Tambah Paket' }}</h2>
+            {% if error %}
+            <p class="md:col-span-2 bg-red-100 border border-red-400 text-red-700 px-4 py-3 rounded" role="alert">{{ error }}</p>
+            {% endif %}
+            <div>
+                <label for="id" class="block text-xs font-semibold text-gray-600 mb-1">ID (huruf kecil, angka, tanda hubung)</label>
+                <input type="text" id="id" name="id" value="{{ form.id }}" {% if editing %}disabled{% else %}required pattern="[a-z0-9][a-z0-9-]*"{% endif %} class="w-full border-gray-300 rounded-md shadow-sm">
+            </div>
+            <div>
+                <label for="name" class="block text-xs font-semibold text-gray-600 mb-1">Nama</label>
+                <input type="text" id="name" name="name" value="{{ form.name }}" required class="w-full border-gray-300 rounded-md shadow-sm">
+            </div>
+            <div>
+                <label for="price" class="block text-xs font-semibold text-gray-600 mb-1">Harga</label>
+                <input type="text" id="price" name="price" value="{{ form.price }}" class="w-full border-gray-300 rounded-md shadow-sm">
+            </div>
+            <div class="flex gap-4">
+                <div class="flex-1">
+                    <label for="capacity" class="block text-xs font-semibold text-gray-600 mb-1">Kapasitas/Hari (kosong = tanpa batas)</label>
+                    <input type="number" min="0" id="capacity" name="capacity" value="{{ form.capacity if form.capacity is not none }}" class="w-full border-gray-300 rounded-md shadow-sm">
+                </div>
+                <div class="flex-1">
+                    <label for="position" class="block text-xs font-semibold text-gray-600 mb-1">Urutan</label>
+                    <input type="number" id="position" name="position" value="{{ form.position }}" class="w-full border-gray-300 rounded-md shadow-sm">
+                </div>
+            </div>
+            <div class="md:col-span-2">
+                <label for="description" class="block text-xs font-semibold text-gray-600 mb-1">Deskripsi</label>
+                <textarea id="description" name="description" rows="2" class="w-full border-gray-300 rounded-md shadow-sm">{{ form.description }}</textarea>
+            </div>
+            <div>
+                <label for="features" class="block text-xs font-semibold text-gray-600 mb-1">Fitur (satu per baris)</label>
+                <textarea id="features" name="features" rows="4" class="w-full border-gray-300 rounded-md shadow-sm">{{ form.features | join('\\n') }}</textarea>
+            </div>
+            <div>
+                <label for="icon" class="block text-xs font-semibold text-gray-600 mb-1">Ikon (SVG)</label>
+                <textarea id="icon" name="icon" rows="4" class="w-full border-gray-300 rounded-md shadow-sm font-mono text-xs">{{ form.icon }}</textarea>
+            </div>
+            <label class="flex items-center gap-2"><input type="checkbox" name="active" value="1" {% if form.active %}checked{% endif %}> Tampilkan di halaman utama</label>
+            <div class="flex justify-end gap-2">
+                {% if editing %}<a href="{{ url_for('.admin_packages') }}" class="px-4 py-2 rounded-md text-gray-600 hover:bg-gray-100">Batal</a>{% endif %}
+                <button type="submit" class="bg-blue-600 text-white font-semibold px-5 py-2 rounded-md hover:bg-blue-700">Simpan</button>
+            </div>
+        </form>
+    </div>
+</body>
+</html>
+"""
 
-        nama_layanan = next((pkg['name'] for pkg in PACKAGES if pkg['id'] == layanan_id), "Tidak Ditemukan")
-        
-        db = get_db()
-        db.execute(
-            'INSERT INTO bookings (nama, email, telepon, tanggal_acara, layanan, pesan) VALUES (?, ?, ?, ?, ?, ?)',
-            (nama, email, telepon, tanggal_acara, nama_layanan, pesan)
-        )
-        db.commit()
-        
-        return redirect(url_for('success'))
+# --- REGISTRI TEMPLATE & CACHE HALAMAN ---
 
-@app.route('/success')
-def success():
-    """Menampilkan halaman konfirmasi."""
-    return render_template_string(SUCCESS_TEMPLATE)
+# Semua template didaftarkan ke loader Jinja oleh create_app(). Jinja
+# mengompilasi setiap template sekali saat pertama dipakai dan menyimpannya
+# di cache environment, sehingga template tidak di-parse ulang pada setiap
+# request seperti ketika memakai render_template_string().
+TEMPLATES = {
+    '_assets.html': ASSETS_TEMPLATE,
+    'home.html': HOME_TEMPLATE,
+    'success.html': SUCCESS_TEMPLATE,
+    'login.html': LOGIN_TEMPLATE,
+    'admin.html': ADMIN_TEMPLATE,
+    'packages.html': PACKAGES_ADMIN_TEMPLATE,
+}
 
-# --- ROUTING ADMIN ---
+class CachedPage:
+    """Hasil render halaman statis beserta varian gzip dan ETag-nya."""
 
-@app.route('/admin')
-def admin_dashboard():
-    """Menampilkan dashboard admin dengan semua pesanan."""
-    if not session.get('logged_in'):
-        return redirect(url_for('admin_login'))
+    def __init__(self, body):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+# Cache halaman (AppState.page_cache) berisi halaman yang isinya hanya
+# bergantung pada katalog paket dan manifest aset/galeri. Dikosongkan oleh
+# get_catalog() dan watched_manifest() ketika salah satunya berubah.
+
+def invalidate_page_cache():
+    """Menghapus semua halaman yang sudah di-cache."""
+    state = get_state()
+    with state.lock:
+        state.page_cache.clear()
+
+def cached_page(name, **context):
+    """Mengirim halaman dari cache, dengan dukungan gzip dan If-None-Match."""
+    state = get_state()
+    asset_manifest()  # membuang cache jika aset baru saja dibangun ulang
+    page = state.page_cache.get(name)
+    if page is None:
+        with state.lock:
+            page = state.page_cache.get(name)
+            if page is None:
+                page = CachedPage(render_template(name, **context).encode('utf-8'))
+                state.page_cache[name] = page
+
+    use_gzip = 'gzip' in request.accept_encodings
+    # ETag kuat harus berbeda untuk setiap representasi byte.
+    etag = page.etag + ('-gz' if use_gzip else '')
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(page.gzip_body if use_gzip else page.body)
+        response.content_type = 'text/html; charset=utf-8'
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# --- ASET STATIS ---
+
+# Font yang disajikan sendiri: (keluarga, file di ASSETS_SOURCE_DIR, rentang
+# ketebalan). Inter variable font mencakup semua ketebalan yang dipakai
+# template dalam satu file woff2.
+FONTS = [
+    ('Inter', 'fonts/InterVariable.woff2', '100 900'),
+]
+
+TAILWIND_INPUT = """@tailwind base;
+@tailwind components;
+@tailwind utilities;
+"""
+
+# Hanya format teks yang dikompresi; woff2 dan gambar sudah terkompresi.
+COMPRESSIBLE_ASSETS = ('.css', '.js', '.svg', '.json')
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+
+def assets_path(key):
+    """Path absolut dari ASSETS_DIR atau ASSETS_SOURCE_DIR."""
+    return os.path.join(current_app.root_path, current_app.config[key])
+
+def watched_manifest(attr, path, default):
+    """Membaca file manifest JSON, dimuat ulang hanya jika mtime-nya berubah.
+
+    Hasilnya disimpan di AppState.<attr> sebagai (mtime, isi). Ketika
+    manifest berganti, cache halaman ikut dikosongkan agar HTML merujuk ke
+    file yang baru.
+    """
+    state = get_state()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != getattr(state, attr)[0]:
+        with state.lock:
+            content = default
+            if mtime is not None:
+                with open(path, encoding='utf-8') as f:
+                    content = json.load(f)
+            setattr(state, attr, (mtime, content))
+            state.page_cache.clear()
+    return getattr(state, attr)[1]
+
+def asset_manifest():
+    """Pemetaan nama aset ke nama file ber-fingerprint hasil build."""
+    return watched_manifest('asset_manifest', os.path.join(assets_path('ASSETS_DIR'), 'manifest.json'), {})
+
+def asset_url(name):
+    """URL aset ber-fingerprint, atau None jika aset belum dibangun."""
+    filename = asset_manifest().get(name)
+    if filename is None:
+        return None
+    return url_for('fotografi.asset', filename=filename)
+
+def preload_fonts():
+    return [url for url in (asset_url(name) for _, name, _ in FONTS) if url]
+
+@bp.app_context_processor
+def inject_asset_helpers():
+    return {'asset_url': asset_url, 'preload_fonts': preload_fonts}
+
+
+def write_asset(out_dir, name, data):
+    """Menyimpan aset dengan hash isi di nama file, beserta varian gzip/brotli."""
+    stem, ext = os.path.splitext(name)
+    filename = '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:12], ext)
+    path = os.path.join(out_dir, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    variants = [('', data)]
+    if ext in COMPRESSIBLE_ASSETS:
+        variants.append(('.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, content in variants:
+        with open(path + suffix, 'wb') as f:
+            f.write(content)
+    return filename
+
+def build_assets():
+    """Membangun CSS Tailwind yang hanya berisi kelas terpakai, plus font lokal.
+
+    Template diekstrak ke folder sementara agar bisa dipindai oleh Tailwind
+    CLI, bersama markup ikon paket (bawaan dan dari tabel packages) yang
+    kelasnya tidak muncul di template mana pun. Hasilnya ditulis dengan nama ber-fingerprint, lalu manifest.json
+    diganti secara atomik sehingga proses web langsung memakainya.
+    """
+    command = shlex.split(current_app.config['TAILWIND_BIN'])
+    if not shutil.which(command[0]):
+        raise click.ClickException(
+            'Tailwind CLI tidak ditemukan (%s). Unduh standalone CLI v3 dari '
+            'https://github.com/tailwindlabs/tailwindcss/releases atau atur TAILWIND_BIN.' % command[0])
+    source_dir = assets_path('ASSETS_SOURCE_DIR')
+    out_dir = assets_path('ASSETS_DIR')
+    manifest = {}
+
+    font_faces = []
+    for family, name, weight in FONTS:
+        try:
+            with open(os.path.join(source_dir, name), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            click.echo('Peringatan: %s tidak ditemukan, font %s dilewati.' % (name, family), err=True)
+            continue
+        manifest[name] = write_asset(out_dir, name, data)
+        font_faces.append(
+            "@font-face { font-family: '%s'; font-style: normal; font-weight: %s; "
+            "font-display: swap; src: url('%s') format('woff2'); }" % (family, weight, manifest[name]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, source in TEMPLATES.items():
+            with open(os.path.join(tmp, name), 'w', encoding='utf-8') as f:
+                f.write(source)
+        icons = [pkg['icon'] for pkg in DEFAULT_PACKAGES]
+        icons += [row[0] for row in get_db().execute('SELECT icon FROM packages')]
+        with open(os.path.join(tmp, '_package_icons.html'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(icons))
+        with open(os.path.join(tmp, 'input.css'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(font_faces + [TAILWIND_INPUT]))
+        output = os.path.join(tmp, 'app.css')
+        result = subprocess.run(
+            command + ['-i', os.path.join(tmp, 'input.css'), '-o', output,
+                       '--content', os.path.join(tmp, '*.html'), '--minify'],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            raise click.ClickException('Tailwind CLI gagal:\n%s' % result.stderr)
+        with open(output, 'rb') as f:
+            manifest['app.css'] = write_asset(out_dir, 'app.css', f.read())
+
+    tmp_manifest = os.path.join(out_dir, 'manifest.json.tmp')
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_manifest, os.path.join(out_dir, 'manifest.json'))
+    return manifest
+
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Menyajikan aset hasil build dengan cache jangka panjang.
+
+    Nama file sudah mengandung hash isi, sehingga aman ditandai immutable.
+    Varian .br/.gz yang sudah dikompresi saat build dipilih sesuai
+    Accept-Encoding.
+    """
+    directory = assets_path('ASSETS_DIR')
+    if filename.endswith('.json'):
+        abort(404)  # manifest.json tidak ber-fingerprint, jangan di-cache immutable
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    sent, encoding = filename, None
+    for candidate, suffix in ASSET_ENCODINGS:
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            sent, encoding = filename + suffix, candidate
+            break
+    response = send_from_directory(directory, sent, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+# --- GALERI PORTOFOLIO ---
+
+# Foto asli diunggah ke PORTFOLIO_DIR; turunannya (beberapa lebar, WebP dan
+# JPEG) disimpan di PORTFOLIO_CACHE_DIR/<hash isi>/ sehingga hanya dibuat
+# ulang jika file aslinya berubah. Halaman hanya membaca manifest.json.
+PORTFOLIO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+PORTFOLIO_FORMATS = {'webp': ('WEBP', '.webp'), 'jpeg': ('JPEG', '.jpg')}
+PORTFOLIO_SIZES = '(min-width: 768px) 25vw, 50vw'
+
+
+def file_digest(path):
+    """Hash SHA-256 isi file, dibaca per blok agar foto besar tidak dimuat utuh."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(functools.partial(f.read, 1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+def photo_alt(filename):
+    """Teks alt bawaan dari nama file, misalnya 'pernikahan-budi_01.jpg'."""
+    stem = os.path.splitext(filename)[0]
+    return re.sub(r'[-_]+', ' ', stem).strip().capitalize() or 'Foto portofolio'
+
+def process_photo(source, cache_dir, widths, formats, quality):
+    """Membuat turunan satu foto; dijalankan di proses terpisah.
+
+    Mengembalikan metadata turunan. Jika folder hash-nya sudah berisi
+    meta.json, foto tidak diproses ulang.
+    """
+    key = file_digest(source)
+    out_dir = os.path.join(cache_dir, key)
+    meta_path = os.path.join(out_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    with Image.open(source) as image:
+        # draft() meminta decoder JPEG men-skala saat decode (1/2, 1/4, 1/8),
+        # jauh lebih cepat dan hemat memori untuk foto kamera 20-40 MB.
+        image.draft('RGB', (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    full_width, full_height = image.size
+
+    os.makedirs(out_dir, exist_ok=True)
+    targets = sorted({min(w, full_width) for w in widths}, reverse=True)
+    variants = {name: [] for name in formats}
+    for width in targets:
+        height = round(full_height * width / full_width)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for name in formats:
+            pil_format, ext = PORTFOLIO_FORMATS[name]
+            filename = '%d%s' % (width, ext)
+            tmp = os.path.join(out_dir, filename + '.tmp')
+            # EXIF (termasuk lokasi GPS) sengaja tidak ikut disimpan
+            resized.save(tmp, pil_format, quality=quality, optimize=True,
+                         **({'progressive': True} if pil_format == 'JPEG' else {'method': 4}))
+            os.replace(tmp, os.path.join(out_dir, filename))
+            variants[name].append((width, '%s/%s' % (key, filename)))
+        image = resized  # lebar berikutnya lebih kecil, cukup diperkecil dari hasil ini
+
+    meta = {
+        'key': key,
+        'width': targets[0],
+        'height': round(full_height * targets[0] / full_width),
+        'variants': {name: sorted(items) for name, items in variants.items()},
+    }
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+# manifest.json berisi {"photos": [...], "failed": [...]}: photos untuk
+# halaman, failed mencatat file yang tidak bisa dibaca (nama, ukuran, mtime)
+# agar tidak dicoba ulang di setiap build sampai file-nya berubah.
+
+def load_portfolio_manifest(cache_dir):
+    """(foto, gagal) dari manifest terakhir, masing-masing {nama file asli: entri}."""
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, list):  # format lama
+            manifest = {'photos': manifest, 'failed': []}
+        return ({photo['source']: photo for photo in manifest['photos']},
+                {entry['source']: entry for entry in manifest['failed']})
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}, {}
+
+def same_file(entry, stat):
+    return entry is not None and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns
+
+def build_portfolio(source_dir, cache_dir, widths, formats, quality, workers=None, logger=None):
+    """Memproses semua foto di source_dir lalu menulis manifest galeri.
+
+    Foto yang nama, ukuran dan mtime-nya sama dengan manifest sebelumnya
+    dipakai ulang (atau, jika dulu gagal, dilewati) tanpa dibaca; sisanya
+    diproses paralel di ProcessPoolExecutor. Foto yang gagal diproses
+    dilewati dan dicatat di manifest agar satu file rusak tidak menggagalkan
+    seluruh galeri. Folder turunan yang tidak lagi dirujuk manifest dihapus.
+    Mengembalikan daftar foto yang tampil.
+    """
+    if Image is None:
+        raise RuntimeError('Pillow belum terpasang (pip install Pillow)')
+    os.makedirs(source_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    sources = sorted(name for name in os.listdir(source_dir)
+                     if name.lower().endswith(PORTFOLIO_EXTENSIONS))
+    previous, previous_failed = load_portfolio_manifest(cache_dir)
+    entries = {}
+    failed = {}
+    pending = {}
+    for name in sources:
+        stat = os.stat(os.path.join(source_dir, name))
+        old = previous.get(name)
+        if same_file(old, stat) and os.path.exists(os.path.join(cache_dir, old['key'], 'meta.json')):
+            entries[name] = old
+        elif same_file(previous_failed.get(name), stat):
+            failed[name] = previous_failed[name]
+        else:
+            pending[name] = stat
+
+    if pending:
+        # spawn, bukan fork: proses web sudah menjalankan beberapa thread
+        # (penulis antrean, notifikasi, pool) yang tidak aman ikut di-fork.
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {name: executor.submit(process_photo, os.path.join(source_dir, name), cache_dir,
+                                             tuple(widths), tuple(formats), quality)
+                       for name in pending}
+            for name, future in futures.items():
+                stat = pending[name]
+                try:
+                    meta = future.result()
+                except Exception:
+                    if logger is not None:
+                        logger.exception('Foto portofolio %s gagal diproses, dilewati', name)
+                    failed[name] = {'source': name, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+                    continue
+                entries[name] = dict(meta, source=name, alt=photo_alt(name),
+                                     size=stat.st_size, mtime=stat.st_mtime_ns)
+    photos = [entries[name] for name in sources if name in entries]
+    manifest = {'photos': photos, 'failed': [failed[name] for name in sources if name in failed]}
+
+    # Tidak ditulis ulang jika isinya sama, supaya cache halaman tidak ikut kosong
+    if manifest != {'photos': list(previous.values()), 'failed': list(previous_failed.values())}:
+        tmp = os.path.join(cache_dir, 'manifest.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, os.path.join(cache_dir, 'manifest.json'))
+
+    used = {photo['key'] for photo in photos}
+    for entry in os.listdir(cache_dir):
+        if entry not in used and os.path.isdir(os.path.join(cache_dir, entry)):
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    return photos
+
+def portfolio_settings(app):
+    config = app.config
+    return dict(
+        source_dir=os.path.join(app.root_path, config['PORTFOLIO_DIR']),
+        cache_dir=os.path.join(app.root_path, config['PORTFOLIO_CACHE_DIR']),
+        widths=config['PORTFOLIO_WIDTHS'],
+        formats=config['PORTFOLIO_FORMATS'],
+        quality=config['PORTFOLIO_QUALITY'],
+        workers=config['PORTFOLIO_WORKERS'],
+    )
+
+def schedule_portfolio_build():
+    """Memproses galeri di latar belakang (satu build dalam satu waktu)."""
+    state = get_state()
+    app = current_app._get_current_object()
+    with state.lock:
+        if state.portfolio_builder is None:
+            state.portfolio_builder = ThreadPoolExecutor(1, thread_name_prefix='portfolio')
+            atexit.register(state.portfolio_builder.shutdown)
+
+    def run():
+        try:
+            build_portfolio(logger=app.logger, **portfolio_settings(app))
+        except Exception:
+            app.logger.exception('Gagal memproses galeri portofolio')
+
+    return state.portfolio_builder.submit(run)
+
+def portfolio_manifest():
+    """Daftar foto galeri dari manifest, dimuat ulang hanya jika berubah."""
+    manifest = watched_manifest('portfolio_manifest', os.path.join(
+        current_app.root_path, current_app.config['PORTFOLIO_CACHE_DIR'], 'manifest.json'), {})
+    # Manifest versi lama (sebelum ada daftar gagal) berupa list foto saja
+    return manifest if isinstance(manifest, list) else manifest.get('photos', [])
+
+def photo_srcset(photo, fmt):
+    return ', '.join('%s %dw' % (url_for('fotografi.portfolio_image', filename=path), width)
+                     for width, path in photo['variants'][fmt])
+
+def photo_src(photo, fmt, width=640):
+    """URL varian terkecil yang lebarnya minimal `width` (fallback untuk src)."""
+    variants = photo['variants'][fmt]
+    path = next((path for w, path in variants if w >= width), variants[-1][1])
+    return url_for('fotografi.portfolio_image', filename=path)
+
+@bp.app_context_processor
+def inject_portfolio_helpers():
+    return {'photo_srcset': photo_srcset, 'photo_src': photo_src, 'photo_sizes': PORTFOLIO_SIZES}
+
+
+@bp.route('/galeri/<path:filename>')
+def portfolio_image(filename):
+    """Menyajikan turunan foto; nama folder berupa hash isi sehingga immutable."""
+    directory = os.path.join(current_app.root_path, current_app.config['PORTFOLIO_CACHE_DIR'])
+    if filename.endswith('.json'):
+        abort(404)
+    response = send_from_directory(directory, filename, max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def is_valid_photo(stream):
+    """True jika isi stream benar-benar gambar JPEG, PNG atau WebP yang utuh."""
+    try:
+        with Image.open(stream) as image:
+            valid = image.format in ('JPEG', 'PNG', 'WEBP')
+            image.verify()
+    except Exception:  # Pillow memakai banyak jenis exception untuk file rusak
+        valid = False
+    stream.seek(0)
+    return valid
+
+@bp.route('/admin/galeri/upload', methods=['POST'])
+def upload_portfolio():
+    """Menyimpan foto portofolio yang diunggah lalu memprosesnya di latar belakang."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+    if Image is None:
+        return 'Pillow belum terpasang di server (pip install Pillow).', 503
+
+    source_dir = os.path.join(current_app.root_path, current_app.config['PORTFOLIO_DIR'])
+    os.makedirs(source_dir, exist_ok=True)
+    saved = 0
+    for upload in request.files.getlist('foto'):
+        filename = secure_filename(upload.filename or '')
+        if not filename.lower().endswith(PORTFOLIO_EXTENSIONS) or not is_valid_photo(upload.stream):
+            continue
+        stem, ext = os.path.splitext(filename)
+        path = os.path.join(source_dir, filename)
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(source_dir, '%s-%d%s' % (stem, counter, ext))
+            counter += 1
+        upload.save(path)
+        saved += 1
+    if not saved:
+        return 'Tidak ada foto JPEG, PNG atau WebP yang valid di unggahan.', 400
+    schedule_portfolio_build()
+    return redirect(url_for('.admin_dashboard'))
+
+
+# --- ANTREAN PENYIMPANAN PESANAN ---
+
+class PendingBooking:
+    """Pesanan di dalam antrean yang menunggu disimpan oleh thread penulis."""
+
+    def __init__(self, booking, overbooking=None):
+        self.booking = booking
+        self.overbooking = overbooking
+        self.booking_id = None
+        self.error = None
+        self._done = threading.Event()
+
+    def resolve(self, booking_id=None, error=None):
+        self.booking_id = booking_id
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Menunggu sampai batch berisi pesanan ini ter-commit."""
+        if not self._done.wait(timeout):
+            raise TimeoutError('Pesanan belum tersimpan setelah %s detik' % timeout)
+        if self.error is not None:
+            raise self.error
+        return self.booking_id
+
+
+class BookingQueue:
+    """Antrean terbatas dengan satu thread penulis yang melakukan group commit.
+
+    Pesanan dikumpulkan hingga batch_size buah atau batch_delay detik sejak
+    pesanan pertama, lalu disimpan dalam satu transaksi: dengan
+    BOOKING_DURABILITY='commit' tepat satu fsync WAL per batch.
+    """
+
+    _STOP = object()
+
+    def __init__(self, app, maxsize=1000, batch_size=100, batch_delay=0.01):
+        self.app = app
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name='booking-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, booking, block=False, overbooking=None):
+        """Memasukkan pesanan ke antrean; melempar queue.Full jika penuh.
+
+        overbooking menimpa konfigurasi OVERBOOKING untuk pesanan ini.
+        """
+        pending = PendingBooking(booking, overbooking)
+        self._queue.put(pending, block=block)
+        return pending
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def stop(self):
+        """Menyimpan semua pesanan yang tersisa lalu menghentikan thread penulis."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        with self.app.app_context():
+            self._write_loop()
+
+    def _write_loop(self):
+        db = connect_db(self.app.config, isolation_level=None)
+        if self.app.config['BOOKING_DURABILITY'] == 'commit':
+            # Respons menunggu batch ini, jadi COMMIT-nya harus benar-benar
+            # sampai ke disk: satu fsync WAL per batch.
+            db.execute('PRAGMA synchronous=FULL')
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.batch_delay
+                stop = False
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._flush(db, batch)
+                if stop:
+                    return
+        finally:
+            db.close()
+
+    def _flush(self, db, batch):
+        results = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for pending in batch:
+                # Savepoint per pesanan: satu pesanan yang gagal tidak
+                # membatalkan pesanan lain di batch yang sama.
+                db.execute('SAVEPOINT pesanan')
+                try:
+                    results.append((insert_booking(db, pending.booking, pending.overbooking), None))
+                except Exception as e:
+                    db.execute('ROLLBACK TO pesanan')
+                    results.append((None, e))
+                db.execute('RELEASE pesanan')
+            db.execute('COMMIT')
+        except Exception as e:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            self.app.logger.exception('Gagal menyimpan batch %d pesanan', len(batch))
+            results = [(None, e)] * len(batch)
+        else:
+            wake_dispatcher()
+
+        for pending, (booking_id, error) in zip(batch, results):
+            if error is not None and not isinstance(error, sqlite3.Error):
+                self.app.logger.warning('Pesanan ditolak: %s', error)
+            pending.resolve(booking_id, error)
+
+
+def get_booking_queue():
+    """Membuat antrean pesanan (sekali per proses) saat pertama dibutuhkan."""
+    state = get_state()
+    if state.booking_queue is None:
+        get_pool()  # pastikan schema sudah dimigrasikan sebelum thread penulis jalan
+        with state.lock:
+            if state.booking_queue is None:
+                app = current_app._get_current_object()
+                state.booking_queue = BookingQueue(
+                    app,
+                    maxsize=app.config['BOOKING_QUEUE_SIZE'],
+                    batch_size=app.config['BOOKING_BATCH_SIZE'],
+                    batch_delay=app.config['BOOKING_BATCH_DELAY'],
+                )
+                atexit.register(state.booking_queue.stop)
+    return state.booking_queue
+
+
+POOL_GAUGES = ('size', 'idle', 'in_use', 'max_size')
+metrics.gauge('db_pool_connections', 'Koneksi pool database menurut keadaan.',
+              lambda: [({'keadaan': key}, value) for key, value in get_pool().stats().items()
+                       if key in POOL_GAUGES])
+metrics.gauge('db_pool_events_total', 'Kejadian pada pool database (dibuat, dipinjam, menunggu, timeout, dibuang).',
+              lambda: [({'event': key}, value) for key, value in get_pool().stats().items()
+                       if key not in POOL_GAUGES], kind='counter')
+metrics.gauge('booking_queue_depth', 'Jumlah pesanan yang menunggu di antrean penulis.',
+              lambda: [({}, get_state().booking_queue.qsize() if get_state().booking_queue else 0)])
+
+
+# --- NOTIFIKASI PELANGGAN ---
+
+NOTIFICATION_TEMPLATES = {
+    'pesanan_baru': (
+        'Pesanan #{id} telah kami terima',
+        'Halo {nama},\n\n'
+        'Terima kasih telah memesan paket {layanan} untuk tanggal {tanggal_acara} di FotografiKu. '
+        'Tim kami akan segera menghubungi Anda untuk konfirmasi lebih lanjut.\n\n'
+        'Nomor pesanan: #{id}\n\nSalam,\nFotografiKu',
+    ),
+    'status_berubah': (
+        'Status pesanan #{id}: {status}',
+        'Halo {nama},\n\n'
+        'Status pesanan #{id} (paket {layanan}, tanggal {tanggal_acara}) sekarang: {status}.\n\n'
+        'Salam,\nFotografiKu',
+    ),
+}
+
+
+def whatsapp_number(telepon):
+    """Menormalkan nomor telepon Indonesia ke format internasional (62...)."""
+    digits = re.sub(r'\D', '', telepon or '')
+    if digits.startswith('0'):
+        digits = '62' + digits[1:]
+    return digits or None
+
+
+def enqueue_notifications(db, event, booking):
+    """Menulis notifikasi email dan WhatsApp untuk satu pesanan ke outbox.
+
+    Dipanggil di dalam transaksi yang sama dengan perubahan pesanan, sehingga
+    notifikasi hanya terkirim jika perubahan tersebut ter-commit.
+    """
+    subject, body = NOTIFICATION_TEMPLATES[event]
+    subject, body = subject.format(**booking), body.format(**booking)
+    now = time.time()
+    rows = []
+    if booking.get('email'):
+        rows.append((booking['id'], event, 'email', booking['email'], subject, body, now))
+    nomor = whatsapp_number(booking.get('telepon'))
+    if nomor:
+        rows.append((booking['id'], event, 'whatsapp', nomor, None, body, now))
+    db.executemany(
+        'INSERT INTO outbox (booking_id, event, channel, recipient, subject, body, next_attempt_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+
+
+class NotificationSender:
+    """Dasar pengirim notifikasi; subclass cukup mengimplementasikan send().
+
+    send_batch() mengembalikan satu hasil per pesan: None jika terkirim,
+    atau exception penyebab kegagalannya.
+    """
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        results = []
+        for message in messages:
+            try:
+                self.send(message)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class LogSender(NotificationSender):
+    """Hanya mencatat notifikasi ke log; bawaan untuk pengembangan lokal."""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def send(self, message):
+        self.logger.info('Notifikasi %s ke %s: %s', message['channel'], message['recipient'],
+                         message['subject'] or message['body'][:60])
+
+
+class MemorySender(NotificationSender):
+    """Menyimpan notifikasi di memori, untuk pengujian."""
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.sent.append(dict(message))
+
+
+class SmtpSender(NotificationSender):
+    """Mengirim email lewat SMTP, satu koneksi untuk seluruh batch.
+
+    Untuk pengujian lokal bisa memakai server SMTP tiruan, misalnya
+    `python -m aiosmtpd -n -l localhost:1025` dengan SMTP_PORT=1025.
+    """
+
+    def __init__(self, host, port, sender, username=None, password=None, starttls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, app):
+        config = app.config
+        return cls(config['SMTP_HOST'], config['SMTP_PORT'], config['SMTP_FROM'],
+                   config['SMTP_USERNAME'], config['SMTP_PASSWORD'], config['SMTP_STARTTLS'])
+
+    def _message(self, message):
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = message['recipient']
+        email['Subject'] = message['subject']
+        email.set_content(message['body'])
+        return email
+
+    def send(self, message):
+        error = self.send_batch([message])[0]
+        if error is not None:
+            raise error
+
+    def send_batch(self, messages):
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        except (OSError, smtplib.SMTPException) as e:
+            return [e] * len(messages)
+        results = []
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                try:
+                    smtp.send_message(self._message(message))
+                    results.append(None)
+                except smtplib.SMTPRecipientsRefused as e:
+                    results.append(e)
+        except (OSError, smtplib.SMTPException) as e:
+            # Koneksi putus di tengah batch: sisa pesan dicoba lagi nanti
+            results.extend([e] * (len(messages) - len(results)))
+        finally:
+            try:
+                smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                smtp.close()
+        return results
+
+
+class WebhookSender(NotificationSender):
+    """Mengirim pesan WhatsApp lewat gateway HTTP (POST JSON {to, message})."""
+
+    def __init__(self, url, token=None, timeout=10):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, app):
+        if not app.config['WHATSAPP_WEBHOOK_URL']:
+            raise RuntimeError('WHATSAPP_WEBHOOK_URL belum diatur')
+        return cls(app.config['WHATSAPP_WEBHOOK_URL'], app.config['WHATSAPP_TOKEN'])
+
+    def send(self, message):
+        data = json.dumps({'to': message['recipient'], 'message': message['body']}).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = 'Bearer %s' % self.token
+        req = urllib.request.Request(self.url, data=data, headers=headers, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+SENDER_BACKENDS = {
+    'log': lambda app: LogSender(app.logger),
+    'memory': lambda app: MemorySender(),
+    'smtp': SmtpSender.from_config,
+    'webhook': WebhookSender.from_config,
+}
+
+
+def make_sender(spec, app):
+    """Membuat pengirim dari nama backend, atau memakai objek pengirim apa adanya."""
+    if isinstance(spec, str):
+        try:
+            return SENDER_BACKENDS[spec](app)
+        except KeyError:
+            raise ValueError('Backend notifikasi tidak dikenal: %r' % spec) from None
+    return spec
+
+
+class NotificationDispatcher:
+    """Mengirim isi outbox di latar belakang dengan retry dan backoff eksponensial.
+
+    Satu thread mengklaim batch pesan yang jatuh tempo dengan menggeser
+    next_attempt_at sejauh NOTIFY_LEASE, lalu mengirimnya per kanal lewat
+    thread pool. Klaim ini membuat beberapa proses aman menguras outbox yang
+    sama, dan pesan yang terputus di tengah jalan (misalnya karena restart)
+    otomatis dicoba lagi setelah lease habis.
+    """
+
+    def __init__(self, app):
+        config = app.config
+        self.app = app
+        self.senders = {channel: make_sender(spec, app) for channel, spec in config['NOTIFY_SENDERS'].items()}
+        self.batch_size = config['NOTIFY_BATCH_SIZE']
+        self.poll_interval = config['NOTIFY_POLL_INTERVAL']
+        self.lease = config['NOTIFY_LEASE']
+        self.max_attempts = config['NOTIFY_MAX_ATTEMPTS']
+        self.backoff_base = config['NOTIFY_BACKOFF_BASE']
+        self.backoff_max = config['NOTIFY_BACKOFF_MAX']
+        self.retention = config['NOTIFY_RETENTION_DAYS'] * 86400
+        self.prune_interval = config['NOTIFY_PRUNE_INTERVAL']
+        self._pruned_at = 0.0
+        self._executor = ThreadPoolExecutor(config['NOTIFY_WORKERS'], thread_name_prefix='notify-sender')
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='notify-dispatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Membangunkan dispatcher setelah ada notifikasi baru yang ter-commit."""
+        self._wake.set()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+        self._executor.shutdown()
+
+    def _run(self):
+        with self.app.app_context():
+            self.run_forever()
+
+    def run_forever(self):
+        db = connect_db(self.app.config, isolation_level=None)
+        try:
+            while not self._stop.is_set():
+                try:
+                    sent = self.dispatch_once(db)
+                    if time.monotonic() - self._pruned_at >= self.prune_interval:
+                        self.prune(db)
+                except sqlite3.Error:
+                    self.app.logger.exception('Gagal memproses outbox notifikasi')
+                    sent = 0
+                except RuntimeError:
+                    if self._stop.is_set() or sys.is_finalizing():
+                        # Thread pool sudah ditutup karena interpreter berhenti;
+                        # pesan yang telanjur diklaim dikirim lagi setelah lease habis.
+                        return
+                    self.app.logger.exception('Gagal memproses outbox notifikasi')
+                    sent = 0
+                if sent < self.batch_size:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+        finally:
+            db.close()
+
+    def prune(self, db, batch_size=500):
+        """Menghapus notifikasi terkirim yang lebih tua dari NOTIFY_RETENTION_DAYS.
+
+        Untuk baris terkirim, next_attempt_at adalah waktu klaim terakhir
+        (praktis waktu kirim), sehingga penghapusan memakai idx_outbox_pending
+        dan dilakukan per batch pendek. Mengembalikan jumlah baris terhapus.
+        """
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - self.retention
+        deleted = 0
+        while True:
+            cur = db.execute(
+                "DELETE FROM outbox WHERE id IN ("
+                "  SELECT id FROM outbox WHERE status = 'terkirim' AND next_attempt_at < ? LIMIT ?)",
+                (cutoff, batch_size))
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                return deleted
+
+    def backoff(self, attempts):
+        """Jeda sebelum percobaan berikutnya: eksponensial, dibatasi, dengan jitter."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def claim(self, db):
+        now = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id IN ("
+                "  SELECT id FROM outbox WHERE status = 'menunggu' AND next_attempt_at <= ?"
+                "  ORDER BY next_attempt_at LIMIT ?"
+                ") RETURNING id, channel, recipient, subject, body, attempts",
+                (now + self.lease, now, self.batch_size)
+            ).fetchall()
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return [dict(row) for row in rows]
+
+    def dispatch_once(self, db):
+        """Mengklaim, mengirim dan mencatat hasil satu batch; mengembalikan jumlah pesan."""
+        messages = self.claim(db)
+        if not messages:
+            return 0
+        by_channel = {}
+        for message in messages:
+            by_channel.setdefault(message['channel'], []).append(message)
+        futures = [self._executor.submit(self._send_channel, channel, batch)
+                   for channel, batch in by_channel.items()]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        self._record(db, results)
+        return len(messages)
+
+    def _send_channel(self, channel, messages):
+        sender = self.senders.get(channel)
+        start = time.perf_counter()
+        if sender is None:
+            errors = [LookupError('Tidak ada pengirim untuk kanal %s' % channel)] * len(messages)
+        else:
+            try:
+                errors = sender.send_batch(messages)
+            except Exception as e:
+                errors = [e] * len(messages)
+        elapsed = (time.perf_counter() - start) / len(messages)
+        for error in errors:
+            metrics.observe('notification_send_duration_seconds', elapsed, channel=channel)
+            metrics.inc('notifications_total', channel=channel, result='gagal' if error else 'terkirim')
+        return list(zip(messages, errors))
+
+    def _record(self, db, results):
+        now = time.time()
+        sent, retry, failed = [], [], []
+        for message, error in results:
+            attempts = message['attempts'] + 1
+            if error is None:
+                sent.append((attempts, message['id']))
+                continue
+            reason = '%s: %s' % (type(error).__name__, error)
+            if attempts >= self.max_attempts:
+                failed.append((attempts, reason, message['id']))
+                self.app.logger.error('Notifikasi #%d ke %s gagal permanen: %s',
+                                      message['id'], message['recipient'], reason)
+            else:
+                retry.append((attempts, reason, now + self.backoff(attempts), message['id']))
+                self.app.logger.warning('Notifikasi #%d ke %s gagal (percobaan %d): %s',
+                                        message['id'], message['recipient'], attempts, reason)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                "UPDATE outbox SET status = 'terkirim', attempts = ?, last_error = NULL, "
+                "sent_at = CURRENT_TIMESTAMP WHERE id = ?", sent)
+            db.executemany(
+                'UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?', retry)
+            db.executemany(
+                "UPDATE outbox SET status = 'gagal', attempts = ?, last_error = ? WHERE id = ?", failed)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+
+def get_dispatcher():
+    """Menjalankan dispatcher notifikasi (sekali per proses) jika diaktifkan."""
+    state = get_state()
+    if state.dispatcher is None and current_app.config['NOTIFY_DISPATCHER'] == 'thread':
+        get_pool()  # pastikan tabel outbox sudah ada
+        with state.lock:
+            if state.dispatcher is None:
+                state.dispatcher = NotificationDispatcher(current_app._get_current_object()).start()
+                atexit.register(state.dispatcher.stop)
+    return state.dispatcher
+
+
+def wake_dispatcher():
+    """Memberi tahu dispatcher bahwa ada notifikasi baru di outbox."""
+    dispatcher = get_state().dispatcher
+    if dispatcher is not None:
+        dispatcher.wake()
+
+
+@bp.before_app_request
+def start_dispatcher():
+    # Dimulai saat request pertama agar pesan yang tertunda sebelum restart
+    # ikut terkirim tanpa menunggu pesanan baru.
+    if get_state().dispatcher is None:
+        get_dispatcher()
+
+
+metrics.describe('notification_send_duration_seconds', 'histogram',
+                 'Durasi pengiriman notifikasi per pesan dan kanal.', LATENCY_BUCKETS)
+metrics.describe('notifications_total', 'counter', 'Jumlah percobaan kirim notifikasi per kanal dan hasil.')
+metrics.gauge('notification_outbox_depth', 'Jumlah notifikasi di outbox yang belum terkirim.',
+              lambda: [({'channel': channel, 'status': status}, count) for channel, status, count in get_db().execute(
+                  "SELECT channel, status, COUNT(*) FROM outbox WHERE status IN ('menunggu', 'gagal') "
+                  "GROUP BY channel, status")])
+
+
+# --- PEMBATASAN LAJU ---
+
+class TokenBucketStore:
+    """Dasar penyimpanan token bucket; subclass mengimplementasikan hit()."""
+
+    def hit(self, key, capacity, period, now=None):
+        """Mengambil satu token dari bucket `key`.
+
+        Bucket berisi maksimal `capacity` token dan terisi penuh kembali
+        dalam `period` detik. Mengembalikan (diizinkan, detik sampai token
+        berikutnya tersedia).
+        """
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(TokenBucketStore):
+    """Token bucket di memori proses, dibatasi max_keys entri (LRU).
+
+    Entri yang paling lama tidak dipakai dibuang lebih dulu; bucket yang
+    dibuang sama saja dengan bucket penuh, jadi batasnya tidak pernah
+    lebih ketat dari seharusnya.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, capacity, period, now=None):
+        now = time.monotonic() if now is None else now
+        rate = capacity / period
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class SqliteRateLimitStore(TokenBucketStore):
+    """Token bucket di file SQLite terpisah, dipakai bersama oleh semua worker.
+
+    Sengaja tidak memakai database pesanan agar hitungan rate limit tidak
+    berebut kunci tulis dengan penyimpanan pesanan. Setiap hit adalah satu
+    UPSERT pada primary key; baris yang sudah lama tidak dipakai dibersihkan
+    sesekali.
+    """
+
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, path, idle_after=3600):
+        self.path = path
+        self.idle_after = idle_after
+        self._local = threading.local()
+        self._hits = itertools.count()
+        db = self._connect()
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL'
+            ') WITHOUT ROWID'
+        )
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            # Hitungan rate limit boleh hilang saat listrik padam; tanpa fsync
+            db.execute('PRAGMA synchronous=OFF')
+            self._local.db = db
+        return db
+
+    def hit(self, key, capacity, period, now=None):
+        now = time.time() if now is None else now
+        rate = capacity / period
+        db = self._connect()
+        tokens, allowed = db.execute(
+            'INSERT INTO rate_limits (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            '  allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1, '
+            '  tokens = MIN(:capacity, tokens + (:now - updated) * :rate) '
+            '           - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1), '
+            '  updated = :now '
+            'RETURNING tokens, allowed',
+            {'key': key, 'capacity': capacity, 'now': now, 'rate': rate}
+        ).fetchone()
+        if next(self._hits) % self.CLEANUP_EVERY == 0:
+            db.execute('DELETE FROM rate_limits WHERE updated < ?', (now - self.idle_after,))
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / rate
+
+
+def get_rate_limiter():
+    """Membuat penyimpanan rate limit (sekali per proses) sesuai konfigurasi."""
+    state = get_state()
+    if state.rate_limiter is None:
+        with state.lock:
+            if state.rate_limiter is None:
+                config = current_app.config
+                if config['RATE_LIMIT_STORAGE'] == 'sqlite':
+                    # Bucket yang menganggur selama periode terpanjang sudah penuh lagi
+                    idle_after = max([period for _, period in config['RATE_LIMITS'].values()] or [3600])
+                    state.rate_limiter = SqliteRateLimitStore(
+                        os.path.join(current_app.root_path, config['RATE_LIMIT_DATABASE']), idle_after)
+                else:
+                    state.rate_limiter = MemoryRateLimitStore(config['RATE_LIMIT_MAX_KEYS'])
+    return state.rate_limiter
+
+@bp.before_app_request
+def enforce_rate_limit():
+    """Menolak POST yang melebihi batas per IP dan per endpoint dengan 429."""
+    limit = current_app.config['RATE_LIMITS'].get(request.endpoint)
+    if limit is None or request.method != 'POST':
+        return None
+    capacity, period = limit
+    allowed, retry_after = get_rate_limiter().hit(
+        '%s|%s' % (request.endpoint, request.remote_addr), capacity, period)
+    if allowed:
+        return None
+    metrics.inc('rate_limited_total', endpoint=request.endpoint)
+    retry_after = max(1, math.ceil(retry_after))
+    return ('Terlalu banyak permintaan. Silakan coba lagi dalam %d detik.' % retry_after,
+            429, {'Retry-After': str(retry_after)})
+
+metrics.describe('rate_limited_total', 'counter', 'Jumlah request yang ditolak oleh rate limit per endpoint.')
+
+
+# --- ROUTING APLIKASI ---
+
+def home_context():
+    """Konteks halaman utama, juga dipakai saat formulir ditampilkan ulang dengan error."""
+    return {'packages': get_catalog().active, 'gallery': portfolio_manifest()}
+
+@bp.route('/')
+def home():
+    """Menampilkan halaman utama."""
+    return cached_page('home.html', **home_context())
+
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'[A-Za-z0-9-]{16,64}')
+
+def idempotency_key(value):
+    """Kunci idempotensi dari formulir, atau None jika tidak ada/tidak valid."""
+    return value if IDEMPOTENCY_KEY_PATTERN.fullmatch(value) else None
+
+metrics.describe('duplicate_submissions_total', 'counter', 'Jumlah pengiriman formulir ganda yang tidak disimpan ulang.')
+
+@bp.route('/submit', methods=['POST'])
+def submit():
+    """Menyimpan data dari formulir ke database."""
+    if request.method == 'POST':
+        nama = request.form['nama']
+        email = request.form['email']
+        telepon = request.form['telepon']
+        tanggal_acara = request.form['tanggal_acara']
+        layanan_id = request.form['layanan']
+        pesan = request.form['pesan']
+
+        catalog = get_catalog()
+        pkg = catalog.get(layanan_id)
+        if pkg is None or not pkg['active']:
+            return render_template('home.html', error='Paket yang dipilih tidak tersedia.',
+                                   **home_context()), 400
+        # Tanggal menjadi kunci kapasitas dan penghitung bulanan, jadi harus
+        # satu bentuk baku (YYYY-MM-DD): '2027-1-1' dan '2027-01-01' sama.
+        try:
+            tanggal_acara = datetime.date.fromisoformat(tanggal_acara).isoformat()
+        except ValueError:
+            return render_template('home.html', error='Tanggal acara tidak valid.',
+                                   **home_context()), 400
+        booking = {
+            'nama': nama,
+            'email': email,
+            'telepon': telepon,
+            'tanggal_acara': tanggal_acara,
+            'package_id': pkg['id'],
+            'layanan': pkg['name'],
+            'pesan': pesan,
+            'idempotency_key': idempotency_key(request.form.get('idempotency_key', '')),
+        }
+
+        try:
+            if current_app.config['BOOKING_INGEST'] == 'queue':
+                durable = current_app.config['BOOKING_DURABILITY'] == 'commit'
+                if not durable:
+                    # Tidak ada yang menunggu hasil penulis: tanggal penuh ditolak
+                    # sekarang, dan yang sudah diterima tidak boleh dibuang diam-diam.
+                    check_capacity(get_db(), booking)
+                try:
+                    pending = get_booking_queue().submit(booking, overbooking=None if durable else 'flag')
+                except queue.Full:
+                    # Backpressure: lebih baik menolak dengan cepat daripada
+                    # menumpuk request yang menunggu kunci database.
+                    return busy_response()
+                if durable:
+                    try:
+                        pending.wait(current_app.config['BOOKING_WAIT_TIMEOUT'])
+                    except TimeoutError:
+                        return busy_response()
+            else:
+                db = get_db()
+                # Halaman sukses berarti pesanan sudah di disk: commit ini
+                # memakai fsync WAL. synchronous hanya bisa diubah di luar
+                # transaksi, jadi dikembalikan setelah commit/rollback.
+                db.execute('PRAGMA synchronous=FULL')
+                try:
+                    insert_booking(db, booking)
+                    db.commit()
+                except BookingRejected:
+                    db.rollback()
+                    raise
+                except sqlite3.IntegrityError:
+                    # Pengiriman ganda yang tiba bersamaan: salinan lain dengan
+                    # kunci yang sama sudah tersimpan lebih dulu.
+                    db.rollback()
+                    if not booking['idempotency_key']:
+                        raise
+                    metrics.inc('duplicate_submissions_total')
+                    return redirect(url_for('.success'))
+                finally:
+                    if not db.in_transaction:
+                        db.execute('PRAGMA synchronous=NORMAL')
+                wake_dispatcher()
+        except BookingRejected as e:
+            return render_template('home.html', error=str(e), **home_context()), 409
+
+        return redirect(url_for('.success'))
+
+@bp.app_errorhandler(PoolTimeout)
+def busy_response(error=None):
+    """Respons 503 ketika antrean pesanan atau pool koneksi sedang penuh."""
+    return 'Server sedang sibuk, silakan coba lagi dalam beberapa detik.', 503, {'Retry-After': '5'}
+
+@bp.route('/availability')
+def availability():
+    """Mengembalikan tanggal yang sudah penuh per paket untuk satu bulan."""
+    month = request.args.get('month', '')
+    if not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', month):
+        return jsonify(error='Parameter month harus berformat YYYY-MM.'), 400
+    year, mon = int(month[:4]), int(month[5:])
+    next_month = '%04d-%02d' % (year + mon // 12, mon % 12 + 1)
+
+    db = get_db()
+    rows = db.execute(
+        'SELECT tanggal, package_id, terisi FROM availability WHERE tanggal >= ? AND tanggal < ? AND terisi > 0',
+        (month + '-01', next_month + '-01')
+    ).fetchall()
+
+    catalog = get_catalog()
+    booked = {pkg['id']: {} for pkg in catalog.active}
+    full = {pkg['id']: [] for pkg in catalog.active}
+    for tanggal, package_id, terisi in rows:
+        if package_id not in booked:
+            continue
+        booked[package_id][tanggal] = terisi
+        capacity = catalog.get(package_id)['capacity']
+        if capacity is not None and terisi >= capacity:
+            full[package_id].append(tanggal)
+
+    response = jsonify(
+        month=month,
+        capacity={pkg['id']: pkg['capacity'] for pkg in catalog.active},
+        booked=booked,
+        full=full,
+    )
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@bp.route('/success')
+def success():
+    """Menampilkan halaman konfirmasi."""
+    return cached_page('success.html')
+
+# --- ROUTING ADMIN ---
+
+# Jumlah pesanan per halaman dashboard admin
+PAGE_SIZE = 50
+
+def booking_filters(args):
+    """Membangun klausa WHERE dari filter query string dashboard.
+
+    Mengembalikan (filters, where, params): filters berisi nilai yang aktif
+    untuk ditampilkan kembali di form, where dan params siap dipakai di SQL.
+    Setiap filter dilayani oleh salah satu indeks di schema.
+    """
+    filters = {}
+    where = []
+    params = []
+
+    # scope=arsip membaca bookings_archive; filter lain tetap berlaku
+    if args.get('scope') == 'arsip':
+        filters['scope'] = 'arsip'
+
+    status = args.get('status', '')
+    if status in STATUSES:
+        filters['status'] = status
+        where.append('status = ?')
+        params.append(status)
+
+    layanan = args.get('layanan', '')
+    if layanan:
+        filters['layanan'] = layanan
+        where.append('package_id = ?')
+        params.append(layanan)
+
+    tanggal_dari = args.get('tanggal_dari', '')
+    if tanggal_dari:
+        filters['tanggal_dari'] = tanggal_dari
+        where.append('tanggal_acara >= ?')
+        params.append(tanggal_dari)
+
+    tanggal_sampai = args.get('tanggal_sampai', '')
+    if tanggal_sampai:
+        filters['tanggal_sampai'] = tanggal_sampai
+        where.append('tanggal_acara <= ?')
+        params.append(tanggal_sampai)
+
+    return filters, where, params
+
+# Tokenizer trigram mencocokkan potongan teks di mana saja (termasuk
+# potongan nomor telepon), tetapi butuh minimal 3 karakter per kata kunci.
+FTS_MIN_TERM_LENGTH = 3
+# Bobot bm25 untuk kolom nama, email, telepon, pesan
+FTS_WEIGHTS = '10.0, 5.0, 5.0, 1.0'
+
+def fts_query(text):
+    """Mengubah input pencarian menjadi ekspresi MATCH FTS5 yang aman.
+
+    Setiap kata dijadikan frasa ber-kutip sehingga karakter khusus FTS5
+    tidak ditafsirkan sebagai operator. Mengembalikan None jika tidak ada
+    kata yang cukup panjang.
+    """
+    terms = [term for term in text.split() if len(term) >= FTS_MIN_TERM_LENGTH]
+    if not terms:
+        return None
+    return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+def booking_source(db, filters):
+    """(tabel, tabel FTS) untuk scope dashboard: pesanan aktif atau arsip."""
+    if filters.get('scope') == 'arsip':
+        archive = archive_table(db)
+        return archive, archive + '_fts'
+    return 'bookings', 'bookings_fts'
+
+def parse_cursor(value):
+    """Mengurai cursor paginasi berformat '<kunci urut>|<id>'."""
+    timestamp, sep, order_id = value.rpartition('|')
+    if not sep or not order_id.isdigit():
+        return None
+    return timestamp, int(order_id)
+
+@bp.route('/admin')
+def admin_dashboard():
+    """Menampilkan dashboard admin dengan semua pesanan."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
     
+    filters, where, params = booking_filters(request.args)
+    search = request.args.get('q', '').strip()
+    search_error = None
+    first_url = next_url = None
     db = get_db()
-    orders = db.execute('SELECT * FROM bookings ORDER BY timestamp DESC').fetchall()
-    return render_template_string(ADMIN_TEMPLATE, orders=orders)
+    archived = filters.get('scope') == 'arsip'
+    table, fts_table = booking_source(db, filters)
+
+    if search:
+        # Pencarian teks: hasil diurutkan berdasarkan relevansi (bm25),
+        # jadi paginasinya memakai nomor halaman.
+        page = request.args.get('halaman', '1')
+        page = int(page) if page.isdigit() and int(page) > 0 else 1
+        orders = []
+        match = fts_query(search)
+        if match is None:
+            search_error = 'Kata kunci pencarian minimal %d karakter.' % FTS_MIN_TERM_LENGTH
+        else:
+            # MATCH dan bm25() butuh nama tabel FTS tanpa prefiks schema/alias
+            fts_name = fts_table.rpartition('.')[2]
+            sql = ('SELECT b.* FROM %s JOIN %s AS b ON b.id = %s.rowid '
+                   'WHERE %s MATCH ?' % (fts_table, table, fts_name, fts_name))
+            if where:
+                sql += ' AND ' + ' AND '.join(where)
+            sql += ' ORDER BY bm25(%s, %s) LIMIT ? OFFSET ?' % (fts_name, FTS_WEIGHTS)
+            orders = db.execute(sql, [match] + params + [PAGE_SIZE + 1, (page - 1) * PAGE_SIZE]).fetchall()
+        if page > 1:
+            first_url = url_for('.admin_dashboard', q=search, **filters)
+        if len(orders) > PAGE_SIZE:
+            orders = orders[:PAGE_SIZE]
+            next_url = url_for('.admin_dashboard', q=search, halaman=page + 1, **filters)
+    else:
+        # Paginasi keyset: halaman berikutnya dimulai tepat setelah baris
+        # terakhir halaman sebelumnya, sehingga halaman ke-N sama murahnya
+        # dengan halaman pertama (tanpa OFFSET). Dengan filter rentang
+        # tanggal acara, urutannya mengikuti tanggal acara agar indeks
+        # (..., tanggal_acara, id) melayani filter sekaligus urutan.
+        if 'tanggal_dari' in filters or 'tanggal_sampai' in filters:
+            sort_key = 'tanggal_acara'
+        else:
+            sort_key = 'timestamp'
+        cursor = parse_cursor(request.args.get('cursor', ''))
+        if cursor:
+            where.append('(%s, id) < (?, ?)' % sort_key)
+            params.extend(cursor)
+            first_url = url_for('.admin_dashboard', **filters)
 
-@app.route('/admin/login', methods=['GET', 'POST'])
+        sql = 'SELECT * FROM %s' % table
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY %s DESC, id DESC LIMIT ?' % sort_key
+        params.append(PAGE_SIZE + 1)
+
+        orders = db.execute(sql, params).fetchall()
+        if len(orders) > PAGE_SIZE:
+            orders = orders[:PAGE_SIZE]
+            next_cursor = '{}|{}'.format(orders[-1][sort_key], orders[-1]['id'])
+            next_url = url_for('.admin_dashboard', cursor=next_cursor, **filters)
+
+    # Tandai tanggal yang terisi melebihi kapasitas (OVERBOOKING = 'flag')
+    catalog = get_catalog()
+    overbooked = set()
+    slots = {(order['tanggal_acara'], order['package_id']) for order in orders
+             if order['package_id'] and not archived}
+    if slots:
+        placeholders = ', '.join(['(?, ?)'] * len(slots))
+        rows = db.execute(
+            'SELECT tanggal, package_id, terisi FROM availability WHERE (tanggal, package_id) IN (VALUES %s)' % placeholders,
+            [value for slot in slots for value in slot]
+        ).fetchall()
+        for tanggal, package_id, terisi in rows:
+            pkg = catalog.get(package_id)
+            if pkg is not None and pkg['capacity'] is not None and terisi > pkg['capacity']:
+                overbooked.add((tanggal, package_id))
+
+    return render_template(
+        'admin.html',
+        orders=orders,
+        filters=filters,
+        statuses=STATUSES,
+        packages=list(catalog.by_id.values()),
+        package_names=catalog.names,
+        search=search,
+        search_error=search_error,
+        first_url=first_url,
+        next_url=next_url,
+        overbooked=overbooked,
+        archived=archived,
+        summary=load_stats(db),
+        gallery=portfolio_manifest(),
+    )
+
+@bp.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     """Menangani proses login admin."""
     error = None
     if request.method == 'POST':
         # Password sederhana, dalam aplikasi nyata gunakan hashing
-        if request.form['password'] == 'admin123':
+        if hmac.compare_digest(request.form['password'].encode(), b'admin123'):
             session['logged_in'] = True
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('.admin_dashboard'))
         else:
             error = 'Password salah, silakan coba lagi.'
-    return render_template_string(LOGIN_TEMPLATE, error=error)
+    return render_template('login.html', error=error)
 
-@app.route('/admin/logout')
+@bp.route('/admin/logout')
 def admin_logout():
     """Menangani proses logout admin."""
     session.pop('logged_in', None)
-    return redirect(url_for('admin_login'))
+    return redirect(url_for('.admin_login'))
+
+# --- KATALOG PAKET (ADMIN) ---
+
+PACKAGE_ID_PATTERN = re.compile(r'[a-z0-9][a-z0-9-]{0,39}')
+
+def package_form(form):
+    """Memvalidasi formulir paket; mengembalikan (data, pesan error)."""
+    data = {
+        'name': form.get('name', '').strip(),
+        'description': form.get('description', '').strip(),
+        'price': form.get('price', '').strip(),
+        'features': [line.strip() for line in form.get('features', '').splitlines() if line.strip()],
+        'capacity': form.get('capacity', '').strip(),
+        'icon': form.get('icon', '').strip(),
+        'position': form.get('position', '').strip() or '0',
+        'active': bool(form.get('active')),
+    }
+    if not data['name']:
+        return data, 'Nama paket wajib diisi.'
+    if data['capacity'] and not data['capacity'].isdigit():
+        return data, 'Kapasitas harus berupa bilangan bulat.'
+    if not data['position'].lstrip('-').isdigit():
+        return data, 'Urutan harus berupa bilangan bulat.'
+    data['capacity'] = int(data['capacity']) if data['capacity'] else None
+    data['position'] = int(data['position'])
+    return data, None
+
+def package_values(data):
+    return (data['name'], data['description'], data['price'], json.dumps(data['features']),
+            data['capacity'], data['icon'], data['position'], int(data['active']))
+
+def render_packages(form, editing=None, error=None, status=200):
+    packages = list(get_catalog().by_id.values())
+    return render_template('packages.html', packages=packages, form=form, editing=editing, error=error), status
+
+@bp.route('/admin/paket', methods=['GET', 'POST'])
+def admin_packages():
+    """Menampilkan daftar paket dan menambah paket baru."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+
+    if request.method == 'GET':
+        return render_packages({'position': len(get_catalog().by_id), 'active': True, 'features': []})
+
+    data, error = package_form(request.form)
+    data['id'] = package_id = request.form.get('id', '').strip()
+    if error is None and not PACKAGE_ID_PATTERN.fullmatch(package_id):
+        error = 'ID hanya boleh berisi huruf kecil, angka dan tanda hubung (maks. 40 karakter).'
+    if error is None and get_catalog().get(package_id) is not None:
+        error = 'Paket dengan ID %s sudah ada.' % package_id
+    if error:
+        return render_packages(data, error=error, status=400)
+
+    db = get_db()
+    db.execute(
+        'INSERT INTO packages (name, description, price, features, capacity, icon, position, active, id) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        package_values(data) + (package_id,)
+    )
+    db.commit()
+    return redirect(url_for('.admin_packages'))
+
+@bp.route('/admin/paket/<package_id>', methods=['GET', 'POST'])
+def edit_package(package_id):
+    """Mengubah data paket. Pesanan lama tetap menyimpan nama paket saat dipesan."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+    pkg = get_catalog().get(package_id)
+    if pkg is None:
+        abort(404)
+
+    if request.method == 'GET':
+        return render_packages(pkg, editing=pkg)
+
+    data, error = package_form(request.form)
+    data['id'] = package_id
+    if error:
+        return render_packages(data, editing=pkg, error=error, status=400)
 
-@app.route('/admin/update_status/<int:order_id>', methods=['POST'])
+    db = get_db()
+    db.execute(
+        'UPDATE packages SET name = ?, description = ?, price = ?, features = ?, capacity = ?, icon = ?, '
+        'position = ?, active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+        package_values(data) + (package_id,)
+    )
+    db.commit()
+    return redirect(url_for('.admin_packages'))
+
+@bp.route('/admin/paket/<package_id>/nonaktifkan', methods=['POST'])
+def deactivate_package(package_id):
+    """Menyembunyikan paket dari halaman utama tanpa menghapusnya.
+
+    Paket tidak pernah dihapus permanen karena masih dirujuk oleh pesanan.
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+    db = get_db()
+    db.execute('UPDATE packages SET active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (package_id,))
+    db.commit()
+    return redirect(url_for('.admin_packages'))
+
+
+# --- EKSPOR DATA ---
+
+EXPORT_COLUMNS = ['id', 'nama', 'email', 'telepon', 'tanggal_acara', 'package_id', 'layanan', 'pesan', 'status',
+                  'timestamp']
+# Jumlah baris yang diambil dari cursor SQLite per langkah
+EXPORT_CHUNK_SIZE = 500
+
+def export_chunks(pool, args):
+    """Menghasilkan baris pesanan per potongan untuk ekspor.
+
+    Memakai filter yang sama dengan dashboard (termasuk scope=arsip)
+    ditambah since=<id> untuk ekspor inkremental. Baris diurutkan berdasarkan
+    id dan dibaca dengan fetchmany(), sehingga memori tetap konstan berapa
+    pun ukuran tabel.
+    """
+    filters, where, params = booking_filters(args)
+    # Unary + mencegah SQLite memakai indeks status/paket/tanggal: dengan
+    # indeks itu hasilnya harus diurutkan ulang di B-tree sementara (di RAM,
+    # temp_store=MEMORY). Scan menurut rowid langsung keluar urut id.
+    where = ['+' + clause for clause in where]
+    since = args.get('since', '')
+    if since.isdigit():
+        where.append('id > ?')
+        params.append(int(since))
+
+    # Generator berjalan setelah view selesai (di luar konteks aplikasi),
+    # jadi koneksinya dipinjam sendiri dari pool, bukan dari g.
+    db = pool.acquire()
+    try:
+        sql = 'SELECT %s FROM %s' % (', '.join(EXPORT_COLUMNS), booking_source(db, filters)[0])
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY id'
+        cur = db.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+    finally:
+        pool.release(db)
+
+def export_response(body, mimetype, filename):
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': 'attachment; filename=%s' % filename,
+        'Cache-Control': 'no-store',
+    })
+
+# Awalan sel yang dibaca spreadsheet sebagai rumus (CSV formula injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_safe(value):
+    """Menetralkan isi formulir publik yang akan dibuka di spreadsheet."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+@bp.route('/admin/export.csv')
+def export_csv():
+    """Mengekspor pesanan sebagai CSV secara streaming."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+
+    def generate(chunks):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in chunks:
+            writer.writerows([csv_safe(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return export_response(generate(export_chunks(get_pool(), request.args)), 'text/csv', 'bookings.csv')
+
+@bp.route('/admin/export.jsonl')
+def export_jsonl():
+    """Mengekspor pesanan sebagai JSON Lines secara streaming."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+
+    def generate(chunks):
+        for rows in chunks:
+            yield ''.join(json.dumps(dict(row), ensure_ascii=False) + '\n' for row in rows)
+
+    return export_response(generate(export_chunks(get_pool(), request.args)), 'application/x-ndjson', 'bookings.jsonl')
+
+@bp.route('/admin/pool')
+def pool_stats():
+    """Menampilkan statistik pool koneksi database dalam format JSON."""
+    if not session.get('logged_in'):
+        return redirect(url_for('.admin_login'))
+    return jsonify(get_pool().stats())
+
+@bp.route('/admin/update_status/<int:order_id>', methods=['POST'])
 def update_status(order_id):
     """Memperbarui status pesanan."""
     if not session.get('logged_in'):
-        return redirect(url_for('admin_login'))
+        return redirect(url_for('.admin_login'))
         
     status = request.form['status']
+    if status not in STATUSES:
+        return 'Status tidak dikenal.', 400
     db = get_db()
-    db.execute('UPDATE bookings SET status = ? WHERE id = ?', (status, order_id))
+    change_status(db, [order_id], status)
     db.commit()
-    return redirect(url_for('admin_dashboard'))
+    wake_dispatcher()
+    return redirect(url_for('.admin_dashboard'))
+
+# Batas jumlah pesanan dalam satu permintaan ubah status massal
+MAX_BULK_IDS = 1000
+
+@bp.route('/admin/update_status/bulk', methods=['POST'])
+def bulk_update_status():
+    """Memperbarui status banyak pesanan dalam satu transaksi.
+
+    Mengembalikan JSON kecil berisi id yang diubah, bukan dashboard lengkap.
+    """
+    if not session.get('logged_in'):
+        return jsonify(error='Silakan login kembali.'), 401
+
+    status = request.form.get('status', '')
+    if status not in STATUSES:
+        return jsonify(error='Status tidak dikenal.'), 400
+    order_ids = sorted({int(i) for i in request.form.getlist('ids') if i.isdigit()})
+    if not order_ids:
+        return jsonify(error='Tidak ada pesanan yang dipilih.'), 400
+    if len(order_ids) > MAX_BULK_IDS:
+        return jsonify(error='Maksimal %d pesanan sekaligus.' % MAX_BULK_IDS), 400
+
+    db = get_db()
+    changed = change_status(db, order_ids, status)
+    db.commit()
+    wake_dispatcher()
+    return jsonify(status=status, ids=changed, updated=len(changed))
+
+
+# --- ARSIP PESANAN ---
+
+# Pesanan dengan status ini tidak akan berubah lagi dan boleh diarsipkan
+CLOSED_STATUSES = ('Selesai', 'Dibatalkan')
+
+def archive_bookings(db, older_than_days, batch_size=500, pause=0.05):
+    """Memindahkan pesanan tertutup yang sudah lama ke tabel arsip.
+
+    Setiap batch adalah transaksi pendek tersendiri (salin ke arsip lalu
+    hapus dari bookings), diselingi jeda agar penulis lain tidak tertahan.
+    Kandidat dicari sebelum kunci tulis diambil lalu diperiksa ulang di
+    dalam transaksi, sehingga kunci hanya dipegang selama pemindahan.
+    db harus berupa koneksi autocommit (isolation_level=None). Mengembalikan
+    jumlah pesanan yang dipindahkan.
+
+    Jika arsip berada di file lain, commit kedua file dalam mode WAL tidak
+    atomik bersama; karena itu penyalinan memakai INSERT OR IGNORE sehingga
+    batch yang terputus aman diulang.
+    """
+    archive = archive_table(db)
+    cutoff = (datetime.date.today() - datetime.timedelta(days=older_than_days)).isoformat()
+    columns = ', '.join(BOOKING_COLUMNS)
+    status_placeholders = ', '.join('?' * len(CLOSED_STATUSES))
+    moved = 0
+    closed = 'status IN (%s) AND tanggal_acara < ?' % status_placeholders
+    while True:
+        ids = [row[0] for row in db.execute(
+            'SELECT id FROM bookings WHERE %s ORDER BY id LIMIT ?' % closed,
+            CLOSED_STATUSES + (cutoff, batch_size)
+        )]
+        if not ids:
+            return moved
+        # Status bisa berubah antara SELECT di atas dan kunci tulis, jadi
+        # syaratnya diulang pada INSERT dan DELETE.
+        where = 'id IN (%s) AND %s' % (', '.join('?' * len(ids)), closed)
+        params = ids + list(CLOSED_STATUSES) + [cutoff]
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR IGNORE INTO %s (%s) SELECT %s FROM bookings WHERE %s'
+                       % (archive, columns, columns, where), params)
+            moved += db.execute('DELETE FROM bookings WHERE %s' % where, params).rowcount
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        if len(ids) < batch_size:
+            return moved
+        time.sleep(pause)
+
+def compact_database(db, schema='main', step_pages=2000, pause=0.05):
+    """Mengembalikan halaman kosong ke sistem file dengan incremental vacuum.
+
+    Hanya bekerja jika auto_vacuum bernilai INCREMENTAL; mengembalikan
+    jumlah halaman yang dibebaskan, atau None jika mode itu tidak aktif.
+    Vacuum dijalankan bertahap sebanyak step_pages per transaksi.
+    """
+    if db.execute('PRAGMA %s.auto_vacuum' % schema).fetchone()[0] != 2:
+        return None
+    freed = 0
+    while True:
+        free_pages = db.execute('PRAGMA %s.freelist_count' % schema).fetchone()[0]
+        if not free_pages:
+            return freed
+        db.execute('PRAGMA %s.incremental_vacuum(%d)' % (schema, step_pages)).fetchall()
+        freed += min(free_pages, step_pages)
+        time.sleep(pause)
+
+def run_archive_job(config):
+    """Satu putaran arsip + compaction; mengembalikan (dipindahkan, {schema: halaman})."""
+    db = connect_db(config, isolation_level=None)
+    try:
+        moved = archive_bookings(db, config['ARCHIVE_AFTER_DAYS'], config['ARCHIVE_BATCH_SIZE'],
+                                 config['ARCHIVE_BATCH_PAUSE'])
+        schemas = ['main', 'arsip'] if config['ARCHIVE_DATABASE'] else ['main']
+        freed = {schema: compact_database(db, schema, config['VACUUM_STEP_PAGES'], config['ARCHIVE_BATCH_PAUSE'])
+                 for schema in schemas}
+        return moved, freed
+    finally:
+        db.close()
+
+
+class ArchiveWorker:
+    """Thread yang menjalankan run_archive_job() setiap ARCHIVE_INTERVAL detik."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['ARCHIVE_INTERVAL']
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='booking-archiver', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                moved, freed = run_archive_job(self.app.config)
+            except sqlite3.Error:
+                self.app.logger.exception('Gagal mengarsipkan pesanan')
+                continue
+            if moved:
+                self.app.logger.info('%d pesanan diarsipkan, halaman dibebaskan: %s', moved, freed)
+
+
+@bp.before_app_request
+def start_archiver():
+    state = get_state()
+    if state.archiver is None and current_app.config['ARCHIVE_INTERVAL']:
+        with state.lock:
+            if state.archiver is None:
+                state.archiver = ArchiveWorker(current_app._get_current_object()).start()
+                atexit.register(state.archiver.stop)
+
+
+# --- PERINTAH CLI ---
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Menerapkan migrasi schema database yang tertunda."""
+    click.echo('Schema database versi %d.' % init_db())
+
+stats_cli = AppGroup('stats', help='Mengelola penghitung ringkasan dashboard.')
+bp.cli.add_command(stats_cli)
+
+@stats_cli.command('rebuild')
+def stats_rebuild_command():
+    """Menghitung ulang booking_stats dan availability dari pesanan dan arsip."""
+    db = get_db()
+    rebuild_stats(db)
+    rebuild_availability(db)
+    db.commit()
+    click.echo('Penghitung dashboard dan ketersediaan tanggal telah dibangun ulang.')
+
+@stats_cli.command('verify')
+def stats_verify_command():
+    """Memeriksa apakah booking_stats sama dengan hasil hitung ulang."""
+    mismatches = verify_stats(get_db())
+    for dimensi, kunci, stored, expected in mismatches:
+        click.echo('%s=%s: tersimpan %d, seharusnya %d' % (dimensi, kunci, stored, expected))
+    if mismatches:
+        raise click.ClickException('%d penghitung tidak sinkron.' % len(mismatches))
+    click.echo('Semua penghitung sinkron.')
+
+@bp.cli.command('notify')
+@click.option('--once', is_flag=True, help='Kirim semua notifikasi yang jatuh tempo lalu berhenti.')
+def notify_command(once):
+    """Menjalankan pengirim notifikasi outbox di proses terpisah.
+
+    Pakai bersama NOTIFY_DISPATCHER=off pada server web.
+    """
+    get_pool()
+    dispatcher = NotificationDispatcher(current_app._get_current_object())
+    if once:
+        db = connect_db(current_app.config, isolation_level=None)
+        try:
+            total = 0
+            while True:
+                sent = dispatcher.dispatch_once(db)
+                total += sent
+                if sent < dispatcher.batch_size:
+                    break
+            pruned = dispatcher.prune(db)
+        finally:
+            db.close()
+            dispatcher.stop()
+        click.echo('%d notifikasi diproses, %d notifikasi lama dihapus.' % (total, pruned))
+        return
+    click.echo('Mengirim notifikasi dari outbox (Ctrl+C untuk berhenti)...')
+    try:
+        dispatcher.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Membangun CSS dan font lokal ber-fingerprint beserta varian terkompresi."""
+    manifest = build_assets()
+    for name, filename in sorted(manifest.items()):
+        click.echo('%s -> %s' % (name, filename))
+    if brotli is None:
+        click.echo('Modul brotli tidak terpasang; hanya varian gzip yang dibuat.')
+
+@bp.cli.command('process-portfolio')
+def process_portfolio_command():
+    """Membuat turunan foto galeri yang belum ada dan menulis manifest-nya."""
+    try:
+        manifest = build_portfolio(logger=current_app.logger, **portfolio_settings(current_app))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo('%d foto portofolio siap ditampilkan.' % len(manifest))
+
+archive_cli = AppGroup('archive', help='Mengarsipkan pesanan lama dan memadatkan file database.')
+bp.cli.add_command(archive_cli)
+
+@archive_cli.command('run')
+@click.option('--older-than', type=int, help='Umur minimal tanggal acara (hari); bawaan ARCHIVE_AFTER_DAYS.')
+def archive_run_command(older_than):
+    """Memindahkan pesanan Selesai/Dibatalkan yang sudah lama ke arsip."""
+    get_pool()
+    config = dict(current_app.config)
+    if older_than is not None:
+        config['ARCHIVE_AFTER_DAYS'] = older_than
+    moved, freed = run_archive_job(config)
+    click.echo('%d pesanan dipindahkan ke arsip.' % moved)
+    for schema, pages in freed.items():
+        if pages is None:
+            click.echo('%s: auto_vacuum belum INCREMENTAL, jalankan `flask archive enable-auto-vacuum`.' % schema)
+        else:
+            click.echo('%s: %d halaman dikembalikan ke sistem file.' % (schema, pages))
+
+@archive_cli.command('enable-auto-vacuum')
+def archive_enable_auto_vacuum_command():
+    """Mengaktifkan auto_vacuum=INCREMENTAL pada database lama (VACUUM penuh, sekali saja).
+
+    VACUUM menulis ulang seluruh file dan menahan semua penulis selama
+    berjalan; jalankan saat lalu lintas sepi.
+    """
+    get_pool()
+    db = connect_db(current_app.config, isolation_level=None)
+    try:
+        schemas = ['main', 'arsip'] if current_app.config['ARCHIVE_DATABASE'] else ['main']
+        for schema in schemas:
+            if db.execute('PRAGMA %s.auto_vacuum' % schema).fetchone()[0] == 2:
+                click.echo('%s: sudah INCREMENTAL.' % schema)
+                continue
+            db.execute('PRAGMA %s.auto_vacuum = INCREMENTAL' % schema)
+            db.execute('VACUUM %s' % schema)
+            click.echo('%s: auto_vacuum INCREMENTAL aktif.' % schema)
+    finally:
+        db.close()
+
+
+# --- PABRIK APLIKASI ---
+
+class AppState:
+    """Sumber daya milik satu instance aplikasi: pool, antrean, dispatcher dan cache halaman."""
+
+    def __init__(self, app):
+        self.config = app.config
+        self.pool = ConnectionPool(
+            functools.partial(connect_db, app.config),
+            max_size=app.config['DB_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            healthcheck_interval=app.config['DB_HEALTHCHECK_INTERVAL'],
+        )
+        self.booking_queue = None
+        self.dispatcher = None
+        self.page_cache = {}
+        self.asset_manifest = (None, {})
+        self.catalog = None
+        self.rate_limiter = None
+        self.archiver = None
+        self.portfolio_manifest = (None, [])
+        self.portfolio_builder = None
+        self.schema_ready = False
+        self.lock = threading.RLock()
+
+    def ensure_schema(self):
+        """Memeriksa versi schema sekali per proses dan bermigrasi jika perlu."""
+        with self.lock:
+            if not self.schema_ready:
+                migrate_db(self.config)
+                migrate_archive(self.config)
+                self.schema_ready = True
+
+
+def get_state():
+    return current_app.extensions['fotografi']
+
+def create_app(config=None):
+    """Membuat dan mengonfigurasi aplikasi Flask.
+
+    Tidak ada file yang ditulis dan tidak ada koneksi database yang dibuka
+    di sini; schema diperiksa dan dimigrasikan saat koneksi pertama.
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env('FOTOGRAFI')
+    if config:
+        app.config.update(config)
+
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    app.jinja_loader = DictLoader(TEMPLATES)
+    app.extensions['fotografi'] = AppState(app)
+    app.teardown_appcontext(close_db)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.register_blueprint(bp)
+    return app
 
 
 # Menjalankan aplikasi
+# Instance bawaan untuk `python app.py`, `flask --app app` dan `gunicorn app:app`
+app = create_app()
+
 if __name__ == '__main__':
-    init_db() # Inisialisasi database saat aplikasi pertama kali dijalankan
     app.run(debug=True)
@@ -0,0 +1,339 @@
+# Nama file: benchmark.py
+# Deskripsi: Benchmark dan uji beban untuk rute-rute utama app.py.
+#
+# Cara Menjalankan (dari folder yang sama dengan app.py):
+#    python benchmark.py --rows 100k --requests 500 --concurrency 8
+#    python benchmark.py --rows 1k --output hasil.json
+#    python benchmark.py --rows 1k --baseline hasil.json --threshold 0.2
+#
+# Skrip ini membuat database sintetis terpisah (default `bench.db`), lalu
+# menjalankan setiap rute lewat test client Flask dan lewat server WSGI
+# lokal sungguhan dengan beberapa worker paralel. Hasil berupa latensi
+# p50/p95/p99 dan throughput, bisa disimpan sebagai JSON dan dibandingkan
+# dengan hasil sebelumnya. Jika ada regresi melebihi threshold, skrip
+# keluar dengan kode 1.
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as fotografi
+
+ROW_PRESETS = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+# Distribusi paket: pernikahan dan pre-wedding jauh lebih sering dipesan
+PACKAGE_WEIGHTS = {'pernikahan': 40, 'prewedding': 30, 'acara': 20, 'wisuda': 10}
+STATUS_WEIGHTS = {'Baru': 15, 'Dikonfirmasi': 25, 'Selesai': 50, 'Dibatalkan': 10}
+FIRST_NAMES = ['Budi', 'Siti', 'Andi', 'Rina', 'Dewi', 'Agus', 'Putri', 'Joko', 'Ayu', 'Rizky', 'Nur', 'Fajar']
+LAST_NAMES = ['Santoso', 'Wijaya', 'Saputra', 'Lestari', 'Pratama', 'Hidayat', 'Kusuma', 'Nugroho']
+MESSAGES = ['Acara outdoor di taman', 'Mohon info paket tambahan drone', 'Lokasi di Bali',
+            'Tema adat Jawa', '', 'Butuh album tambahan', 'Sesi foto keluarga juga']
+
+
+# --- DATA SINTETIS ---
+
+def popular_dates(count=400):
+    """Tanggal acara dua tahun ke depan, akhir pekan dan musim nikah lebih populer."""
+    start = date.today()
+    dates, weights = [], []
+    for offset in range(count * 2):
+        day = start + timedelta(days=offset)
+        weight = 1.0
+        if day.weekday() >= 5:
+            weight *= 6
+        if day.month in (5, 6, 7, 12):
+            weight *= 3
+        dates.append(day.isoformat())
+        weights.append(weight)
+    return dates, weights
+
+def generate_bookings(rows, seed=42):
+    """Menghasilkan tuple pesanan sintetis yang condong ke tanggal dan paket populer."""
+    rng = random.Random(seed)
+    dates, date_weights = popular_dates()
+    names = {pkg['id']: pkg['name'] for pkg in fotografi.DEFAULT_PACKAGES}
+    packages = list(PACKAGE_WEIGHTS)
+    statuses = list(STATUS_WEIGHTS)
+    created = datetime(2023, 1, 1)
+    step = timedelta(seconds=max(1, 2 * 365 * 86400 // max(rows, 1)))
+    for i in range(rows):
+        nama = '%s %s' % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+        email = '%s.%d@contoh.id' % (nama.split()[0].lower(), i)
+        telepon = '08%010d' % rng.randrange(10 ** 10)
+        tanggal = rng.choices(dates, date_weights)[0]
+        package_id = rng.choices(packages, PACKAGE_WEIGHTS.values())[0]
+        yield (
+            nama,
+            email,
+            telepon,
+            tanggal,
+            package_id,
+            names[package_id],
+            rng.choice(MESSAGES),
+            rng.choices(statuses, STATUS_WEIGHTS.values())[0],
+            (created + step * i).strftime('%Y-%m-%d %H:%M:%S'),
+        )
+
+def seed_database(app, rows):
+    """Membuat ulang database benchmark dengan sejumlah pesanan sintetis."""
+    path = app.config['DATABASE']
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    with app.app_context():
+        fotografi.init_db()
+
+    db = sqlite3.connect(path)
+    data = generate_bookings(rows)
+    while True:
+        chunk = list(itertools.islice(data, 10000))
+        if not chunk:
+            break
+        db.executemany(
+            'INSERT INTO bookings (nama, email, telepon, tanggal_acara, package_id, layanan, pesan, status, timestamp) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', chunk
+        )
+        db.commit()
+    db.close()
+
+    with app.app_context():
+        db = fotografi.get_db()
+        fotografi.rebuild_availability(db)
+        fotografi.rebuild_stats(db)
+        db.commit()
+
+
+# --- SKENARIO ---
+
+def scenarios(rows):
+    """Daftar (nama, method, path, form) untuk setiap rute yang diukur."""
+    rng = random.Random(7)
+    package_ids = list(PACKAGE_WEIGHTS)
+
+    def submit_form():
+        return {
+            'nama': 'Benchmark %d' % rng.randrange(10 ** 6),
+            'email': 'bench@contoh.id',
+            'telepon': '081234567890',
+            'tanggal_acara': (date.today() + timedelta(days=rng.randrange(1, 3000))).isoformat(),
+            'layanan': rng.choice(package_ids),
+            'pesan': 'Pesanan dari benchmark',
+        }
+
+    def update_form():
+        return {'status': rng.choice(fotografi.STATUSES)}
+
+    return [
+        ('home', 'GET', lambda: '/', None),
+        ('submit', 'POST', lambda: '/submit', submit_form),
+        ('admin_dashboard', 'GET', lambda: '/admin', None),
+        ('admin_dashboard_filtered', 'GET',
+         lambda: '/admin?' + urlencode({'status': 'Dikonfirmasi', 'layanan': 'pernikahan'}), None),
+        ('update_status', 'POST',
+         lambda: '/admin/update_status/%d' % rng.randrange(1, max(rows, 1) + 1), update_form),
+    ]
+
+
+# --- PENGUKURAN ---
+
+def summarize(latencies, errors, wall_time):
+    """Menghitung p50/p95/p99 (nearest-rank) dan throughput dalam milidetik."""
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        index = max(0, min(len(latencies) - 1, int(round(p / 100 * len(latencies) + 0.5)) - 1))
+        return round(latencies[index] * 1000, 3)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / wall_time, 1) if wall_time else None,
+    }
+
+def is_ok(status):
+    # 302 = redirect setelah submit/update, 409 = tanggal penuh
+    return status < 400 or status == 409
+
+def run_test_client(app, requests_per_route, rows):
+    """Menjalankan setiap skenario secara berurutan lewat test client Flask."""
+    client = app.test_client()
+    client.post('/admin/login', data={'password': 'admin123'})
+    results = {}
+    for name, method, path, form in scenarios(rows):
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(requests_per_route):
+            url, data = path(), form() if form else None
+            t0 = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            latencies.append(time.perf_counter() - t0)
+            errors += not is_ok(response.status_code)
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+    return results
+
+class ServerWorker:
+    """Klien HTTP keep-alive dengan cookie session admin sendiri."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = ''
+        status, headers = self.request('POST', '/admin/login', {'password': 'admin123'})
+        self.cookie = headers.get('Set-Cookie', '').split(';', 1)[0]
+
+    def request(self, method, url, form=None):
+        body = urlencode(form) if form else None
+        headers = {'Cookie': self.cookie}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conn.request(method, url, body=body, headers=headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            self.conn.request(method, url, body=body, headers=headers)
+            response = self.conn.getresponse()
+        response.read()
+        return response.status, dict(response.getheaders())
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Handler keep-alive tanpa log per request agar tidak mengganggu pengukuran."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+def run_server(app, requests_per_route, concurrency, rows):
+    """Menjalankan setiap skenario lewat server WSGI lokal dengan worker paralel."""
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    local = threading.local()
+
+    def one(method, url, form):
+        if not hasattr(local, 'worker'):
+            local.worker = ServerWorker(server.server_port)
+        t0 = time.perf_counter()
+        status, _ = local.worker.request(method, url, form)
+        return time.perf_counter() - t0, not is_ok(status)
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            for name, method, path, form in scenarios(rows):
+                jobs = [(method, path(), form() if form else None) for _ in range(requests_per_route)]
+                started = time.perf_counter()
+                outcomes = list(pool.map(lambda job: one(*job), jobs))
+                wall_time = time.perf_counter() - started
+                results[name] = summarize([o[0] for o in outcomes], sum(o[1] for o in outcomes), wall_time)
+    finally:
+        server.shutdown()
+    return results
+
+
+# --- PERBANDINGAN ---
+
+def compare(current, baseline, threshold):
+    """Mencari rute yang p95-nya naik atau throughput-nya turun melebihi threshold."""
+    regressions = []
+    for mode, routes in current['results'].items():
+        for route, stats in routes.items():
+            old = baseline.get('results', {}).get(mode, {}).get(route)
+            if not old:
+                continue
+            if old['p95_ms'] and stats['p95_ms'] > old['p95_ms'] * (1 + threshold):
+                regressions.append('%s/%s: p95 %.2f ms -> %.2f ms' % (mode, route, old['p95_ms'], stats['p95_ms']))
+            if old['throughput_rps'] and stats['throughput_rps'] < old['throughput_rps'] * (1 - threshold):
+                regressions.append('%s/%s: throughput %.1f -> %.1f req/s'
+                                   % (mode, route, old['throughput_rps'], stats['throughput_rps']))
+    return regressions
+
+def print_results(results):
+    print('%-16s %-26s %8s %9s %9s %9s %10s %7s' % ('mode', 'route', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'errors'))
+    for mode, routes in results.items():
+        for route, s in routes.items():
+            print('%-16s %-26s %8d %9.2f %9.2f %9.2f %10.1f %7d' % (
+                mode, route, s['requests'], s['p50_ms'], s['p95_ms'], s['p99_ms'], s['throughput_rps'], s['errors']))
+
+def parse_rows(value):
+    return ROW_PRESETS.get(value.lower()) or int(value)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark rute aplikasi pemesanan fotografi.')
+    parser.add_argument('--rows', type=parse_rows, default='1k', help='jumlah pesanan sintetis: 1k, 100k, 1m atau angka')
+    parser.add_argument('--db', default='bench.db', help='file database benchmark (akan dibuat ulang)')
+    parser.add_argument('--reuse-db', action='store_true', help='pakai database yang sudah ada tanpa seeding ulang')
+    parser.add_argument('--requests', type=int, default=200, help='jumlah request per rute')
+    parser.add_argument('--concurrency', type=int, default=8, help='jumlah worker paralel untuk mode server')
+    parser.add_argument('--mode', choices=['testclient', 'server', 'both'], default='both')
+    parser.add_argument('--output', help='simpan hasil sebagai JSON')
+    parser.add_argument('--baseline', help='JSON hasil sebelumnya untuk dibandingkan')
+    parser.add_argument('--threshold', type=float, default=0.2, help='batas regresi relatif (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    # Benchmark mengukur throughput, bukan aturan kapasitas tanggal
+    # Rate limit dimatikan: semua request benchmark datang dari satu IP
+    app = fotografi.create_app({'DATABASE': args.db, 'OVERBOOKING': 'flag', 'RATE_LIMITS': {}})
+
+    if not args.reuse_db:
+        started = time.perf_counter()
+        seed_database(app, args.rows)
+        print('Seeding %d pesanan selesai dalam %.1f detik' % (args.rows, time.perf_counter() - started))
+
+    results = {}
+    if args.mode in ('testclient', 'both'):
+        results['testclient'] = run_test_client(app, args.requests, args.rows)
+    if args.mode in ('server', 'both'):
+        results['server'] = run_server(app, args.requests, args.concurrency, args.rows)
+
+    report = {
+        'meta': {
+            'rows': args.rows,
+            'requests_per_route': args.requests,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print('REGRESI:', line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())